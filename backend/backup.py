@@ -0,0 +1,442 @@
+"""
+Online backup and snapshot management for the SQLite database.
+
+This module copies the live database with SQLite's online backup API
+instead of copying the file, so a snapshot is always a consistent image
+even while the server keeps writing. The copy is done a few pages at a
+time and the backup thread sleeps between steps, which gives concurrent
+writers a chance to take the write lock.
+
+SQLite restarts an online backup whenever another connection writes to
+the source. For a WAL database (the live database is opened in WAL mode)
+the backup connection therefore holds one read transaction for the whole
+copy: every step reads the same snapshot, writers keep committing to the
+WAL, and the backup never restarts. A rollback-journal database cannot do
+this without blocking writers, so there a stepped backup could restart
+forever under sustained write load; after ``max_restarts`` restarts the
+remaining copy is done in a single step.
+
+Command line usage::
+
+    python backup.py snapshot            # take a snapshot and apply retention
+    python backup.py list                # list snapshots, newest first
+    python backup.py restore <snapshot>  # restore a snapshot into the live DB
+"""
+
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable
+
+from sqlalchemy.engine import make_url
+
+from config import settings
+
+SNAPSHOT_PREFIX = "todo-"
+"""str: File name prefix of snapshot files."""
+
+SNAPSHOT_SUFFIX = ".db"
+"""str: File name suffix of snapshot files."""
+
+
+RESTORE_ATTEMPTS = 5
+"""int: Restore copies retried when the target is written while revisions are prepared."""
+
+
+class _TooManyRestarts(Exception):
+    """Raised from the progress callback to abandon a stepped backup."""
+
+
+class _TargetChanged(Exception):
+    """Raised when the restore target was written after its revisions were read."""
+
+
+def sqlite_path(url: str | None = None) -> str:
+    """
+    Return the file path of a SQLite database URL.
+
+    Args:
+        url (str, optional): Database URL. Defaults to ``settings.DATABASE_URL``.
+
+    Returns:
+        str: Absolute path of the database file.
+
+    Raises:
+        ValueError: If the URL is not a file-backed SQLite database.
+    """
+    parsed = make_url(url or settings.DATABASE_URL)
+    if parsed.get_backend_name() != "sqlite" or parsed.database in (None, "", ":memory:"):
+        raise ValueError(f"Online backup requires a file-backed SQLite database: {parsed}")
+    return os.path.abspath(parsed.database)
+
+
+def copy_database(
+    source: str,
+    dest: str,
+    pages: int | None = None,
+    step_sleep: float | None = None,
+    max_restarts: int = 3,
+    on_locked: Callable[[], None] | None = None,
+) -> dict:
+    """
+    Copy one SQLite database into another using the online backup API.
+
+    Args:
+        source (str): Path of the database to read from.
+        dest (str): Path of the database to overwrite.
+        pages (int, optional): Pages copied per step.
+            Defaults to ``settings.BACKUP_PAGES_PER_STEP``.
+        step_sleep (float, optional): Seconds to sleep between steps.
+            Defaults to ``settings.BACKUP_STEP_SLEEP_MS / 1000``.
+        max_restarts (int): Restarts tolerated before finishing in one step
+            (only possible for a source not in WAL mode).
+        on_locked (Callable[[], None], optional): Called once after the
+            first step of a copy that takes more than one step. SQLite
+            holds the destination's write lock from the first step until
+            the copy completes, so no other connection can have written to
+            it since the call. An exception raised here abandons the copy
+            and leaves the destination unchanged.
+
+    Returns:
+        dict: ``pages`` copied, ``steps``, ``restarts``, ``fallback``
+        (True if the copy was finished in one step after too many
+        restarts), ``snapshot`` (True if the copy read one WAL snapshot),
+        ``seconds`` and ``bytes`` written.
+    """
+    pages = pages or settings.BACKUP_PAGES_PER_STEP
+    if step_sleep is None:
+        step_sleep = settings.BACKUP_STEP_SLEEP_MS / 1000
+    stats = {"pages": 0, "steps": 0, "restarts": 0, "fallback": False, "snapshot": False}
+    last_remaining = None
+
+    def progress(status, remaining, total):
+        # 他の接続が書き込むとバックアップは先頭からやり直しになる
+        nonlocal last_remaining, on_locked
+        stats["steps"] += 1
+        if on_locked is not None and remaining:
+            check, on_locked = on_locked, None
+            check()
+        stats["pages"] = total
+        if last_remaining is not None and remaining > last_remaining:
+            stats["restarts"] += 1
+            if stats["restarts"] > max_restarts:
+                raise _TooManyRestarts()
+        last_remaining = remaining
+        # ステップ間で書き込み側にロックを譲る
+        if remaining and step_sleep:
+            time.sleep(step_sleep)
+
+    started = time.perf_counter()
+    # timeout=0: ロック待ちはSQLite内部ではなくステップ間のsleepで行う
+    # isolation_level=None: 読み取りトランザクションを自分で開始・保持する
+    src = sqlite3.connect(source, timeout=0, isolation_level=None)
+    dst = sqlite3.connect(dest, timeout=0)
+    try:
+        if src.execute("PRAGMA journal_mode").fetchone()[0] == "wal":
+            # WALではバックアップ全体で1つのスナップショットを読む（書き込みを妨げず、再スタートしない）
+            src.execute("BEGIN")
+            src.execute("SELECT count(*) FROM sqlite_master").fetchone()
+            stats["snapshot"] = True
+        try:
+            # sleep: ロック競合（BUSY/LOCKED）時の再試行間隔
+            src.backup(dst, pages=pages, progress=progress, sleep=step_sleep)
+        except _TooManyRestarts:
+            # 残りを1ステップでコピーする（読み取りロックは短時間で済む）
+            src.backup(dst, pages=-1, sleep=step_sleep)
+            stats["steps"] += 1
+            stats["fallback"] = True
+    finally:
+        dst.close()
+        src.close()
+    stats["seconds"] = time.perf_counter() - started
+    stats["bytes"] = os.path.getsize(dest)
+    return stats
+
+
+def list_snapshots(backup_dir: str | None = None) -> list[str]:
+    """
+    List snapshot files, newest first.
+
+    Args:
+        backup_dir (str, optional): Directory to scan. Defaults to ``settings.BACKUP_DIR``.
+
+    Returns:
+        list[str]: Snapshot paths sorted from newest to oldest.
+    """
+    backup_dir = backup_dir or settings.BACKUP_DIR
+    if not os.path.isdir(backup_dir):
+        return []
+    names = [
+        n for n in os.listdir(backup_dir)
+        if n.startswith(SNAPSHOT_PREFIX) and n.endswith(SNAPSHOT_SUFFIX)
+    ]
+    # ファイル名のタイムスタンプはソート可能な形式
+    return [os.path.join(backup_dir, n) for n in sorted(names, reverse=True)]
+
+
+def prune_snapshots(backup_dir: str | None = None, retention: int | None = None) -> list[str]:
+    """
+    Delete snapshots beyond the retention count.
+
+    Args:
+        backup_dir (str, optional): Snapshot directory. Defaults to ``settings.BACKUP_DIR``.
+        retention (int, optional): Number of snapshots to keep.
+            Defaults to ``settings.BACKUP_RETENTION``.
+
+    Returns:
+        list[str]: Paths of the deleted snapshots.
+    """
+    retention = settings.BACKUP_RETENTION if retention is None else retention
+    removed = list_snapshots(backup_dir)[max(retention, 0):]
+    for path in removed:
+        os.remove(path)
+    return removed
+
+
+def create_snapshot(
+    backup_dir: str | None = None, retention: int | None = None, prune: bool = True
+) -> dict:
+    """
+    Take an online snapshot of the live database and apply retention.
+
+    The snapshot is written to a temporary file and renamed when complete,
+    so a partially written file never looks like a valid snapshot.
+
+    Args:
+        backup_dir (str, optional): Snapshot directory. Defaults to ``settings.BACKUP_DIR``.
+        retention (int, optional): Number of snapshots to keep.
+        prune (bool): Apply retention after the snapshot. Defaults to True.
+
+    Returns:
+        dict: Copy statistics plus ``path`` of the snapshot and ``pruned`` paths.
+
+    Example:
+        >>> from backup import create_snapshot
+        >>> create_snapshot()["path"]
+        './backups/todo-20250101T000000000000Z.db'
+    """
+    backup_dir = backup_dir or settings.BACKUP_DIR
+    os.makedirs(backup_dir, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    path = os.path.join(backup_dir, f"{SNAPSHOT_PREFIX}{stamp}{SNAPSHOT_SUFFIX}")
+    tmp = path + ".partial"
+    try:
+        stats = copy_database(sqlite_path(), tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    stats["path"] = path
+    stats["pruned"] = prune_snapshots(backup_dir, retention) if prune else []
+    return stats
+
+
+def restore_snapshot(snapshot: str, target: str | None = None) -> dict:
+    """
+    Restore a snapshot into the live database.
+
+    The snapshot is first copied to a staging file next to the target,
+    where its table revisions are advanced past the target's current
+    ones. The staging copy is then written into the target in two backup
+    steps. Between them SQLite holds the target's write lock, and the
+    target's revisions are read again: if a write committed after they
+    were first read, the copy is abandoned (the target is unchanged) and
+    retried with fresh revisions. The restored data and its new revisions
+    therefore replace the target atomically, running connections see both
+    on their next transaction, and no revision ever labels two different
+    states of the data.
+
+    Args:
+        snapshot (str): Path of the snapshot to restore.
+        target (str, optional): Database path to overwrite. Defaults to the live database.
+
+    Returns:
+        dict: Copy statistics of the restore.
+
+    Raises:
+        FileNotFoundError: If the snapshot does not exist.
+        RuntimeError: If the target was written during every one of
+            ``RESTORE_ATTEMPTS`` attempts.
+    """
+    if not os.path.isfile(snapshot):
+        raise FileNotFoundError(snapshot)
+    target = target or sqlite_path()
+    staging = target + ".restore.partial"
+    try:
+        copy_database(snapshot, staging, pages=-1, step_sleep=0)
+        for _ in range(RESTORE_ATTEMPTS):
+            # 一時コピー側でリビジョンを対象の現在値より先へ進める
+            before = _read_revisions(target)
+            _advance_revisions(staging, before)
+
+            def check_unchanged():
+                # 対象の書き込みロックを保持した状態で、読み取り後に書き込まれていないか確認する
+                if _read_revisions(target) != before:
+                    raise _TargetChanged()
+
+            # 2ステップでコピーし、1ステップ目の後に確認する（書き込まれていたら中断してやり直す）
+            pages = max(_page_count(staging) - 1, 1)
+            try:
+                return copy_database(staging, target, pages=pages, step_sleep=0, on_locked=check_unchanged)
+            except _TargetChanged:
+                continue
+        raise RuntimeError(f"{target} kept changing; restore abandoned after {RESTORE_ATTEMPTS} attempts")
+    finally:
+        for path in (staging, staging + "-wal", staging + "-shm", staging + "-journal"):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _page_count(path: str) -> int:
+    con = sqlite3.connect(path)
+    try:
+        return con.execute("PRAGMA page_count").fetchone()[0]
+    finally:
+        con.close()
+
+
+def _read_revisions(path: str) -> dict[str, int]:
+    con = sqlite3.connect(path)
+    try:
+        return dict(con.execute("SELECT table_name, revision FROM table_revisions"))
+    except sqlite3.OperationalError:  # テーブルがない古いデータベース
+        return {}
+    finally:
+        con.close()
+
+
+def _advance_revisions(path: str, before: dict[str, int]) -> None:
+    """
+    Move every table revision past its pre-restore value.
+
+    A restored snapshot carries the revisions it had when it was taken.
+    Reusing those numbers would let worker caches keyed by revision serve
+    pre-restore data, so each revision is set beyond both values.
+    """
+    restored = _read_revisions(path)
+    con = sqlite3.connect(path)
+    try:
+        con.execute(
+            "CREATE TABLE IF NOT EXISTS table_revisions "
+            "(table_name VARCHAR NOT NULL PRIMARY KEY, revision INTEGER NOT NULL)"
+        )
+        for table in before.keys() | restored.keys():
+            revision = max(before.get(table, 0), restored.get(table, 0)) + 1
+            con.execute(
+                "INSERT OR REPLACE INTO table_revisions (table_name, revision) VALUES (?, ?)",
+                (table, revision),
+            )
+        con.commit()
+    finally:
+        con.close()
+
+
+class BackupScheduler:
+    """
+    Background thread that takes snapshots at a fixed interval.
+
+    Args:
+        interval (float): Seconds between snapshots.
+        backup_dir (str, optional): Snapshot directory.
+        retention (int, optional): Number of snapshots to keep.
+    """
+
+    def __init__(self, interval: float, backup_dir: str | None = None, retention: int | None = None):
+        self.interval = interval
+        self.backup_dir = backup_dir
+        self.retention = retention
+        self.last_result: dict | None = None
+        self.last_error: str | None = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._lock_file = None
+
+    def start(self) -> bool:
+        """
+        Start the scheduler thread if it is not already running.
+
+        With several worker processes only the one that obtains the lock
+        file in the backup directory runs the scheduler.
+
+        Returns:
+            bool: True if this process runs the scheduler.
+        """
+        if self._thread is None:
+            if not self._acquire_lock():
+                return False
+            self._thread = threading.Thread(target=self._run, name="backup-scheduler", daemon=True)
+            self._thread.start()
+        return True
+
+    def stop(self) -> None:
+        """Stop the scheduler thread and wait for it to exit."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._lock_file is not None:
+            self._lock_file.close()  # ロックも解放される
+            self._lock_file = None
+
+    def _acquire_lock(self) -> bool:
+        try:
+            import fcntl
+        except ImportError:  # Windowsではシングルワーカー前提
+            return True
+        backup_dir = self.backup_dir or settings.BACKUP_DIR
+        os.makedirs(backup_dir, exist_ok=True)
+        lock_file = open(os.path.join(backup_dir, ".scheduler.lock"), "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.last_result = create_snapshot(self.backup_dir, self.retention)
+                self.last_error = None
+            except Exception as e:  # スケジューラは失敗しても次回を試みる
+                self.last_error = str(e)
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Online SQLite backups for the Todo App")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("snapshot", help="take a snapshot and apply retention")
+    sub.add_parser("list", help="list snapshots, newest first")
+    restore = sub.add_parser("restore", help="restore a snapshot into the live database")
+    restore.add_argument("snapshot")
+    restore.add_argument(
+        "--no-safety-snapshot",
+        action="store_true",
+        help="do not snapshot the current database before restoring",
+    )
+    args = parser.parse_args(argv)
+
+    if args.command == "snapshot":
+        result = create_snapshot()
+        print(f"{result['path']}: {result['bytes']} bytes in {result['seconds']:.3f}s "
+              f"({result['steps']} steps, {result['restarts']} restarts)")
+        for path in result["pruned"]:
+            print(f"pruned {path}")
+    elif args.command == "list":
+        for path in list_snapshots():
+            print(path)
+    elif args.command == "restore":
+        if not args.no_safety_snapshot:
+            # 復元対象を保持期間で削除しないよう、ここでは刈り込まない
+            print(f"safety snapshot: {create_snapshot(prune=False)['path']}")
+        result = restore_snapshot(args.snapshot)
+        print(f"restored {args.snapshot} ({result['bytes']} bytes in {result['seconds']:.3f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Benchmark conditional GETs (ETag / If-None-Match) under polling load.
+
+Starts the API against a scratch database with ``--rows`` todos, then runs
+polling clients that fetch ``GET /api/todos`` while a writer changes one
+todo every ``--write-interval`` seconds. The run is repeated with clients
+that do and do not send ``If-None-Match`` and reports the 304 rate,
+latency percentiles and bytes received.
+
+Usage::
+
+    python benchmarks/bench_etag.py --clients 16 --seconds 5
+"""
+
+import argparse
+import http.client
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_workers import BACKEND_DIR, wait_ready  # noqa: E402
+
+PATH = "/api/todos?limit=100"
+
+
+def poller(port: int, stop: threading.Event, conditional: bool, interval: float, results: list) -> None:
+    """Poll the list endpoint, optionally revalidating with the last ETag."""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    etag = None
+    while not stop.is_set():
+        headers = {"If-None-Match": etag} if conditional and etag else {}
+        t0 = time.perf_counter()
+        conn.request("GET", PATH, headers=headers)
+        resp = conn.getresponse()
+        body = resp.read()
+        results.append((resp.status, time.perf_counter() - t0, len(body)))
+        etag = resp.getheader("ETag") or etag
+        if interval:
+            time.sleep(interval)
+
+
+def writer(port: int, stop: threading.Event, interval: float) -> None:
+    """Update one todo every ``interval`` seconds to move the revision."""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    i = 0
+    while not stop.wait(interval):
+        i += 1
+        body = json.dumps({"title": f"edit {i}", "completed": bool(i % 2), "tags": []})
+        conn.request("PUT", "/api/todos/1", body, {"Content-Type": "application/json"})
+        conn.getresponse().read()
+
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] * 1000 if values else 0.0
+
+
+def run(port: int, args, conditional: bool) -> None:
+    stop = threading.Event()
+    results: list = []
+    threads = [threading.Thread(target=poller, args=(port, stop, conditional, args.poll_interval, results))
+               for _ in range(args.clients)]
+    threads.append(threading.Thread(target=writer, args=(port, stop, args.write_interval)))
+    for t in threads:
+        t.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    ok = [r[1] for r in results if r[0] == 200]
+    not_modified = [r[1] for r in results if r[0] == 304]
+    label = "If-None-Match" if conditional else "unconditional"
+    print(f"{label:>14}: {len(results) / args.seconds:7.0f} req/s  "
+          f"304 rate {len(not_modified) / max(len(results), 1):6.1%}  "
+          f"{sum(r[2] for r in results) / args.seconds / 1e6:6.2f} MB/s sent")
+    for name, lat in (("200", ok), ("304", not_modified)):
+        if lat:
+            print(f"{'':>16}{name}: n={len(lat):<7} p50 {statistics.median(lat) * 1000:6.2f} ms  "
+                  f"p99 {percentile(lat, 0.99):6.2f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--poll-interval", type=float, default=0.0)
+    parser.add_argument("--write-interval", type=float, default=0.5)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp}/bench.db", DEBUG="False")
+        seed = (
+            "import main, models, database, revisions\n"
+            "with database.SessionLocal() as db:\n"
+            f"    db.add_all(models.Todo(title=f'todo {{i}}', tags='work,bench') for i in range({args.rows}))\n"
+            "    revisions.bump_revision(db)\n"
+            "    db.commit()\n"
+        )
+        subprocess.run([sys.executable, "-c", seed], cwd=BACKEND_DIR, env=env, check=True)
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--log-level", "warning"],
+            cwd=BACKEND_DIR, env=env,
+        )
+        try:
+            wait_ready(args.port)
+            print(f"{args.clients} pollers, one write every {args.write_interval}s, {args.rows} rows")
+            run(args.port, args, conditional=False)
+            run(args.port, args, conditional=True)
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
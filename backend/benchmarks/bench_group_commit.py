@@ -0,0 +1,137 @@
+"""
+Benchmark write throughput with and without group commit.
+
+Runs ``N`` concurrent writer threads (10 to 500 by default), each inserting
+todos one per request, first with a commit per write and then through
+:class:`group_commit.GroupCommitWriter`. Reports writes per second, latency
+and, for group commit, the average batch size.
+
+Before measuring, one batch is traced at the SQLite level (including the
+BEGIN that pysqlite issues implicitly) to check that it is committed as
+exactly one transaction.
+
+Usage::
+
+    python benchmarks/bench_group_commit.py --writers 10 50 100 500 --seconds 3
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp.name}/bench.db"
+
+import database  # noqa: E402
+import models  # noqa: E402
+import revisions  # noqa: E402
+from group_commit import GroupCommitWriter  # noqa: E402
+
+
+def direct_write(i: int) -> None:
+    """One request's worth of work with its own commit (the default path)."""
+    with database.SessionLocal() as db:
+        db.add(models.Todo(title=f"direct {i}", tags="bench"))
+        revisions.bump_revision(db)
+        db.commit()
+
+
+def check_single_transaction(batch_size: int = 5) -> None:
+    """Trace one batch of ``batch_size`` writes and assert one BEGIN and one COMMIT."""
+    engine = database.make_engine(os.environ["DATABASE_URL"])
+    statements: list[str] = []
+
+    @event.listens_for(engine, "connect")
+    def _trace(dbapi_connection, connection_record):
+        dbapi_connection.set_trace_callback(statements.append)
+
+    writer = GroupCommitWriter(engine, window_ms=200, max_batch=batch_size)
+    writer.start()
+    threads = [
+        threading.Thread(target=writer.submit, args=(lambda db: db.add(models.Todo(title="trace", tags="bench")),))
+        for _ in range(batch_size)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    writer.stop()
+    engine.dispose()
+
+    keywords = [stmt.split()[0].upper() for stmt in statements]
+    assert writer.stats()["batches"] == 1, writer.stats()
+    assert keywords.count("BEGIN") == 1 and keywords.count("COMMIT") == 1, keywords
+    print(f"one batch of {batch_size}: 1 BEGIN, 1 COMMIT, {keywords.count('SAVEPOINT')} SAVEPOINTs")
+
+
+def run(writers: int, seconds: float, write) -> tuple[float, list, int]:
+    stop = threading.Event()
+    latencies: list = []
+    errors = [0]
+
+    def loop(n: int) -> None:
+        i = 0
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            try:
+                write(n * 1_000_000 + i)
+                latencies.append(time.perf_counter() - t0)
+            except Exception:
+                errors[0] += 1
+            i += 1
+
+    threads = [threading.Thread(target=loop, args=(n,)) for n in range(writers)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    return len(latencies) / (time.perf_counter() - started), latencies, errors[0]
+
+
+def report(label: str, rate: float, latencies: list, errors: int, extra: str = "") -> None:
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else 0.0
+    p50 = statistics.median(latencies) * 1000 if latencies else 0.0
+    print(f"  {label:<13} {rate:8.0f} writes/s  p50 {p50:7.2f} ms  p99 {p99:8.2f} ms  errors={errors}{extra}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--writers", type=int, nargs="+", default=[10, 50, 100, 500])
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--window-ms", type=float, default=2.0)
+    parser.add_argument("--max-batch", type=int, default=64)
+    args = parser.parse_args()
+
+    database.create_tables()
+    with database.SessionLocal() as db:
+        revisions.ensure_revisions(db)
+    check_single_transaction()
+
+    for writers in args.writers:
+        print(f"{writers} concurrent writers")
+        report("commit/write", *run(writers, args.seconds, direct_write))
+
+        writer = GroupCommitWriter(database.engine, window_ms=args.window_ms, max_batch=args.max_batch)
+        writer.start()
+        rate, latencies, errors = run(
+            writers, args.seconds,
+            lambda i: writer.submit(lambda db: db.add(models.Todo(title=f"group {i}", tags="bench"))),
+        )
+        writer.stop()
+        report("group commit", rate, latencies, errors, f"  avg batch {writer.stats()['avg_batch']:.1f}")
+
+
+if __name__ == "__main__":
+    main()
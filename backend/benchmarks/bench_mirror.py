@@ -0,0 +1,122 @@
+"""
+Benchmark the in-memory columnar mirror against SQLite.
+
+Fills a scratch database with ``--rows`` todos (random titles, 0-3 tags
+from a ``--tags`` vocabulary, 30% completed), loads the mirror, checks it
+against SQLite with ``mirror.check_consistency`` and then reports:
+
+* mirror memory (``TodoMirror.memory_usage`` and the tracemalloc peak of
+  the load), scaled to one million rows;
+* per-query latency of the mirror and of the SQL query used by
+  ``GET /api/todos`` for several query shapes, both including JSON
+  serialization.
+
+Usage::
+
+    python benchmarks/bench_mirror.py --rows 1000000
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+SHAPES = [
+    ("first page", {}),
+    ("completed=false", {"completed": False}),
+    ("completed=true, skip=5000", {"completed": True, "skip": 5000}),
+    ("tag=tag7", {"tag": "tag7"}),
+    ("tag=TAG1 (substring)", {"tag": "TAG1"}),
+    ("tag=tag3, completed=true", {"tag": "tag3", "completed": True}),
+    ("rare tag, deep page", {"tag": "tag199", "skip": 1000}),
+]
+
+
+def fill(path: str, rows: int, tags: int) -> None:
+    random.seed(0)
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO todos (id, title, completed, tags) VALUES (?, ?, ?, ?)",
+        (
+            (i, f"todo {random.getrandbits(40):x}", random.random() < 0.3,
+             ",".join(f"tag{random.randrange(tags)}" for _ in range(random.randint(0, 3))))
+            for i in range(1, rows + 1)
+        ),
+    )
+    conn.commit()
+    conn.close()
+
+
+def timed(fn, repeat: int) -> float:
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--tags", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench-mirror-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'todo.db')}"
+
+    import database
+    import revisions
+    from crud import todo_list_query
+    from main import todo_list_adapter
+    from mirror import TodoMirror, check_consistency
+
+    database.create_tables()
+    fill(os.path.join(tmp, "todo.db"), args.rows, args.tags)
+
+    mirror = TodoMirror()
+    with database.SessionLocal() as db:
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        mirror.load(db, revisions.current_revision(db))
+        load_seconds = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        problems = check_consistency(mirror, db, max_tags=10)
+
+    per_million = 1_000_000 / args.rows
+    estimate = mirror.memory_usage()
+    print(f"{args.rows} rows, {args.tags} tags, loaded in {load_seconds:.2f}s")
+    print(f"memory: {estimate / 1e6:.1f} MB ({estimate * per_million / 1e6:.0f} MB per 1M rows), "
+          f"load peak {peak / 1e6:.1f} MB ({peak * per_million / 1e6:.0f} MB per 1M rows)")
+    print("consistency:", "ok" if not problems else f"{len(problems)} mismatches")
+
+    print(f"{'query':<28} {'sqlite ms':>10} {'mirror ms':>10} {'speedup':>8}")
+    with database.SessionLocal() as db:
+        for label, shape in SHAPES:
+            skip = shape.get("skip", 0)
+            tag, completed = shape.get("tag"), shape.get("completed")
+
+            def sql():
+                todos = todo_list_query(db, tag=tag, completed=completed).offset(skip).limit(args.limit).all()
+                return todo_list_adapter.dump_json(todo_list_adapter.validate_python(todos, from_attributes=True))
+
+            def mem():
+                rows = mirror.query(tag=tag, completed=completed, skip=skip, limit=args.limit)
+                return todo_list_adapter.dump_json(todo_list_adapter.validate_python(rows))
+
+            assert sql() == mem(), label
+            sql_ms, mem_ms = timed(sql, args.repeat), timed(mem, args.repeat)
+            print(f"{label:<28} {sql_ms:10.2f} {mem_ms:10.2f} {sql_ms / mem_ms:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Benchmark per-request database overhead before and after read-only sessions.
+
+Replays the database work of ``GET /api/todos`` (revision lookup, list
+query, JSON serialization) against a scratch database with ``--rows``
+todos, with two request lifecycles:
+
+* ``before`` - the previous setup: an engine with SQLAlchemy's default
+  pool, a regular ``SessionLocal``-style session per request, and the
+  connection held until the response has been serialized;
+* ``after`` - the engine from ``database.make_engine`` (pool configured
+  from ``settings``), a ``ReadOnlySession`` from ``read_sessionmaker``,
+  and the connection returned to the pool before serialization. (In
+  ``main.py`` coalescing followers and 304 responses also release it right
+  after the revision lookup; a served request checks out one connection.)
+
+Sequential per-request latency is measured in interleaved batches and the
+fastest batch of each lifecycle is reported, which keeps the comparison
+stable on noisy machines. The concurrent run uses ``--threads`` threads
+(FastAPI's threadpool has 40) and reports throughput, pool checkout wait
+and connection hold time from ``engine.pool.stats``.
+
+Usage::
+
+    python benchmarks/bench_pool.py --threads 40 --requests 2000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def make_request(factory, adapter, early_release: bool, limit: int):
+    """Return a callable that performs one list request's database work."""
+    import revisions
+    from crud import todo_list_query
+
+    def request() -> bytes:
+        db = factory()
+        try:
+            revisions.current_revision(db)
+            todos = todo_list_query(db).limit(limit).all()
+            if early_release:
+                db.close()
+            return adapter.dump_json(adapter.validate_python(todos, from_attributes=True))
+        finally:
+            db.close()
+
+    return request
+
+
+def sequential(requests: dict, rounds: int, batch: int) -> dict:
+    """Best per-request latency in microseconds of each lifecycle over interleaved batches."""
+    best = {label: float("inf") for label in requests}
+    for _ in range(rounds):
+        for label, request in requests.items():
+            t0 = time.perf_counter()
+            for _ in range(batch):
+                request()
+            best[label] = min(best[label], (time.perf_counter() - t0) / batch * 1e6)
+    return best
+
+
+def concurrent(request, threads: int, count: int) -> float:
+    """Requests per second with ``threads`` threads sharing ``count`` requests."""
+    per_thread = count // threads
+
+    def worker():
+        for _ in range(per_thread):
+            request()
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    t0 = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return per_thread * threads / (time.perf_counter() - t0)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--threads", type=int, default=40)
+    parser.add_argument("--requests", type=int, default=2000, help="requests per concurrent run")
+    parser.add_argument("--rounds", type=int, default=40, help="interleaved sequential batches")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench-pool-")
+    url = f"sqlite:///{os.path.join(tmp, 'todo.db')}"
+    os.environ["DATABASE_URL"] = url
+
+    from sqlalchemy import create_engine, insert
+    from sqlalchemy.orm import sessionmaker
+
+    import database
+    import models
+    import revisions
+    from main import todo_list_adapter
+
+    with database.SessionLocal() as db:
+        db.execute(insert(models.Todo), [
+            {"title": f"todo {i}", "completed": i % 3 == 0, "_tags": "work,home" if i % 2 else "misc"}
+            for i in range(args.rows)
+        ])
+        revisions.bump_revision(db)
+        db.commit()
+
+    # 変更前: 既定のプール、通常のセッション、シリアライズ完了まで接続を保持
+    before_engine = create_engine(url, connect_args={"check_same_thread": False},
+                                  poolclass=database.TimedQueuePool)
+    before = make_request(sessionmaker(autocommit=False, autoflush=False, bind=before_engine),
+                          todo_list_adapter, early_release=False, limit=args.limit)
+    # 変更後: settingsのプール設定、読み取り専用セッション、シリアライズ前に接続を返却
+    after_engine = database.make_engine(url)
+    after = make_request(database.read_sessionmaker(after_engine),
+                         todo_list_adapter, early_release=True, limit=args.limit)
+
+    print(f"{args.rows} rows, limit {args.limit}, {args.threads} threads, "
+          f"pool: {type(after_engine.pool).__name__} {after_engine.pool.status()}")
+    lifecycles = {"before": (before, before_engine), "after": (after, after_engine)}
+    latency = sequential({label: request for label, (request, _) in lifecycles.items()}, args.rounds, 25)
+
+    print(f"{'lifecycle':<9} {'best us':>8} {'req/s':>8} {'avg wait ms':>12} {'max wait ms':>12} "
+          f"{'avg hold ms':>12} {'connects':>9}")
+    for label, (request, eng) in lifecycles.items():
+        eng.pool.stats = database.PoolStats()
+        rps = concurrent(request, args.threads, args.requests)
+        stats = eng.pool.stats.snapshot()
+        print(f"{label:<9} {latency[label]:8.0f} {rps:8.0f} {stats['avg_wait_ms']:12.3f} "
+              f"{stats['max_wait_ms']:12.3f} {stats['avg_hold_ms']:12.3f} {stats['connects']:9d}")
+
+
+if __name__ == "__main__":
+    main()
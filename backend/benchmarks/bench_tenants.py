@@ -0,0 +1,87 @@
+"""
+Benchmark aggregate write throughput as the number of tenant shards grows.
+
+Runs a fixed number of writer threads, spread round-robin over ``T``
+tenants, each committing one todo per transaction through
+``database.TenantRouter``. With one tenant every writer contends for the
+same SQLite write lock; with more tenants the writers are spread over
+independent shard files. Shards are set up with the same ``on_create``
+as the application (seeding the revision rows), so the writers never race
+to create them.
+
+Usage::
+
+    python benchmarks/bench_tenants.py --tenants 1 2 4 8 16 --writers 32
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp.name}/main.db"
+
+import database  # noqa: E402
+# アプリと同じシャード初期化（database.tenant_router.on_create）を設定する
+import main  # noqa: E402,F401
+import models  # noqa: E402
+import revisions  # noqa: E402
+
+
+def run(router: database.TenantRouter, tenants: int, writers: int, seconds: float) -> tuple[float, int]:
+    names = [f"bench{tenants}-{i}" for i in range(tenants)]
+    for name in names:
+        router.sessionmaker_for(name)  # シャード作成は計測に含めない
+    stop = threading.Event()
+    counts = [0] * writers
+    errors = [0]
+
+    def loop(n: int) -> None:
+        factory = router.sessionmaker_for(names[n % tenants])
+        while not stop.is_set():
+            try:
+                with factory() as db:
+                    db.add(models.Todo(title=f"w{n}", tags="bench"))
+                    revisions.bump_revision(db)
+                    db.commit()
+                counts[n] += 1
+            except Exception:
+                errors[0] += 1
+
+    threads = [threading.Thread(target=loop, args=(n,)) for n in range(writers)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    return sum(counts) / (time.perf_counter() - started), errors[0]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tenants", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--writers", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        router = database.TenantRouter(tmp, max_engines=max(args.tenants),
+                                       on_create=database.tenant_router.on_create)
+        baseline = None
+        print(f"{args.writers} writers, {os.cpu_count()} CPUs")
+        for tenants in args.tenants:
+            rate, errors = run(router, tenants, args.writers, args.seconds)
+            baseline = baseline or rate
+            print(f"tenants={tenants:<4} {rate:8.0f} writes/s  x{rate / baseline:4.2f}  errors={errors}")
+        router.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Benchmark request throughput from 1 to N worker processes.
+
+For each worker count this starts ``uvicorn main:app --workers N`` against
+a scratch database, drives it with concurrent HTTP clients for a fixed
+duration and reports requests per second. A fraction of the requests are
+writes, so the cross-process revision check is exercised as well.
+
+Usage::
+
+    python benchmarks/bench_workers.py --max-workers 4 --seconds 5
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def wait_ready(port: int, timeout: float = 30.0) -> None:
+    """Block until the server answers ``GET /api/todos``."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/api/todos?limit=1")
+            conn.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def client(port: int, stop: threading.Event, write_ratio: float, counts: list) -> None:
+    """Issue requests on one keep-alive connection until ``stop`` is set."""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    done = errors = 0
+    while not stop.is_set():
+        try:
+            if random.random() < write_ratio:
+                body = json.dumps({"title": "bench", "completed": False, "tags": ["bench"]})
+                conn.request("POST", "/api/todos", body, {"Content-Type": "application/json"})
+            else:
+                conn.request("GET", "/api/todos?limit=20")
+            resp = conn.getresponse()
+            resp.read()
+            done += 1
+            errors += resp.status >= 400
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    counts.append((done, errors))
+
+
+def run(workers: int, port: int, clients: int, seconds: float, write_ratio: float) -> tuple[float, int]:
+    """Start a server with ``workers`` processes and measure requests per second."""
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp}/bench.db", DEBUG="False")
+        # テーブルを親プロセスで先に作成する（ワーカー間の作成競合を避ける）
+        subprocess.run([sys.executable, "-c", "import main"], cwd=BACKEND_DIR, env=env, check=True)
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+             "--workers", str(workers), "--log-level", "warning"],
+            cwd=BACKEND_DIR, env=env,
+        )
+        try:
+            wait_ready(port)
+            stop = threading.Event()
+            counts: list = []
+            threads = [threading.Thread(target=client, args=(port, stop, write_ratio, counts))
+                       for _ in range(clients)]
+            for t in threads:
+                t.start()
+            time.sleep(seconds)
+            stop.set()
+            for t in threads:
+                t.join()
+        finally:
+            server.terminate()
+            server.wait()
+    done = sum(c[0] for c in counts)
+    errors = sum(c[1] for c in counts)
+    return done / seconds, errors
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--write-ratio", type=float, default=0.05)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, {args.clients} clients, {args.write_ratio:.0%} writes")
+    baseline = None
+    for workers in range(1, args.max_workers + 1):
+        rps, errors = run(workers, args.port, args.clients, args.seconds, args.write_ratio)
+        baseline = baseline or rps
+        print(f"workers={workers:<3} {rps:9.0f} req/s  x{rps / baseline:4.2f}  errors={errors}")
+
+
+if __name__ == "__main__":
+    main()
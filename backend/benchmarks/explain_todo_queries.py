@@ -0,0 +1,61 @@
+"""
+Verify with EXPLAIN QUERY PLAN that every ``GET /api/todos`` query shape is index-served.
+
+For each combination of ``completed`` filter and ``sort`` key this script
+compiles the exact query built by ``crud.todo_list_query`` and checks that
+SQLite neither needs a temporary B-tree for the ORDER BY nor scans the
+table without an index when filtering by ``completed``. Exits with status 1
+if any shape fails.
+
+Usage::
+
+    python benchmarks/explain_todo_queries.py
+"""
+
+import os
+import sys
+from itertools import product
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import create_engine, text  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+import database  # noqa: E402
+import models  # noqa: F401,E402
+from crud import SORT_COLUMNS, todo_list_query  # noqa: E402
+
+
+def explain(db, query) -> list[str]:
+    """Return the EXPLAIN QUERY PLAN detail lines for an ORM query."""
+    stmt = query.offset(0).limit(100).statement.compile(
+        dialect=db.get_bind().dialect, compile_kwargs={"literal_binds": True}
+    )
+    return [row[-1] for row in db.execute(text(f"EXPLAIN QUERY PLAN {stmt}"))]
+
+
+def main() -> int:
+    # スキーマだけを持つメモリ上のDBで検証する
+    engine = create_engine("sqlite://")
+    database.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+
+    failures = 0
+    for completed, sort, tag in product((None, True, False), SORT_COLUMNS, (None, "work")):
+        plan = explain(db, todo_list_query(db, tag=tag, completed=completed, sort=sort))
+        problems = []
+        if any("TEMP B-TREE" in line for line in plan):
+            problems.append("ORDER BY needs a temporary sort")
+        if completed is not None and not any("USING" in line and "INDEX" in line for line in plan):
+            problems.append("completed filter is not index-served")
+        status = "FAIL" if problems else "ok"
+        failures += bool(problems)
+        shape = f"completed={completed!s:<5} sort={sort:<9} tag={tag or '-':<4}"
+        print(f"[{status:>4}] {shape} {' / '.join(plan)}")
+        for problem in problems:
+            print(f"       - {problem}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""
+Request coalescing (single-flight) for identical concurrent reads.
+
+This module lets identical concurrent requests share a single in-flight
+computation. The first caller for a key (the *leader*) runs the work;
+callers that arrive while it is still running (the *followers*) wait for
+the leader and receive the same result instead of running their own query.
+
+Isolation from writes is handled by the key: callers include the table
+revision (see :mod:`revisions`) so that a reader that starts after a
+committed write never joins a flight that began before it, whichever worker
+process performed the write.
+"""
+
+import threading
+from typing import Any, Callable, Hashable
+
+
+class _Call:
+    """An in-flight computation shared by a leader and its followers."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share the same key.
+
+    Only calls that overlap in time are coalesced; nothing is cached once
+    the leader has finished. Thread-safe, so it can be used from FastAPI's
+    synchronous (threadpool) handlers.
+
+    Example:
+        >>> flight = SingleFlight()
+        >>> flight.do(("todos", 0, 100), lambda: expensive_query())
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _Call] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any],
+           on_wait: Callable[[], None] | None = None) -> Any:
+        """
+        Run ``fn`` once for all concurrent callers with the same ``key``.
+
+        Args:
+            key: Hashable identity of the request (e.g. its query parameters).
+            fn: Zero-argument callable that produces the shared result.
+            on_wait: Called by a follower before it starts waiting for the
+                leader, for example to release resources it will not need.
+
+        Returns:
+            The value returned by ``fn`` in the leader call.
+
+        Raises:
+            Exception: Whatever ``fn`` raised, re-raised in every caller.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.followers += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.leaders += 1
+                leader = True
+
+        if not leader:
+            if on_wait is not None:
+                on_wait()
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result
+
+    def stats(self) -> dict:
+        """
+        Return coalescing counters.
+
+        Returns:
+            dict: ``leaders`` (queries actually executed), ``followers``
+            (requests served from a shared flight), ``in_flight`` and
+            ``coalescing_rate`` (followers / total requests).
+        """
+        with self._lock:
+            total = self.leaders + self.followers
+            return {
+                "leaders": self.leaders,
+                "followers": self.followers,
+                "in_flight": len(self._calls),
+                "coalescing_rate": (self.followers / total) if total else 0.0,
+            }
@@ -17,9 +17,49 @@ class Settings:
     # データベース設定
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./todo.db")
     
+    # コネクションプール設定（DB_POOL_CLASSが空の場合はバックエンドに応じて自動選択）
+    DB_POOL_CLASS: str = os.getenv("DB_POOL_CLASS", "")  # queue / static / null / singleton
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "False").lower() in ("true", "1", "yes", "on")
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "-1"))  # 秒、-1で無効
+    
     # デバッグモード設定
     DEBUG: bool = os.getenv("DEBUG", "False").lower() in ("true", "1", "yes", "on")
     
+    # 同一パラメータの同時GETを1つのクエリに統合するかどうか
+    COALESCE_READS: bool = os.getenv("COALESCE_READS", "True").lower() in ("true", "1", "yes", "on")
+    
+    # GET /api/todos をメモリ上の列指向ミラーから応答するかどうか（メインDBのみ）
+    MIRROR_ENABLED: bool = os.getenv("MIRROR_ENABLED", "False").lower() in ("true", "1", "yes", "on")
+    
+    # テナント別シャーディング設定（テナントごとに別のSQLiteファイルを使用）
+    TENANCY_ENABLED: bool = os.getenv("TENANCY_ENABLED", "False").lower() in ("true", "1", "yes", "on")
+    TENANT_HEADER: str = os.getenv("TENANT_HEADER", "X-Tenant-ID")
+    TENANT_DB_DIR: str = os.getenv("TENANT_DB_DIR", "./tenants")
+    TENANT_MAX_ENGINES: int = int(os.getenv("TENANT_MAX_ENGINES", "64"))
+    
+    # グループコミット設定（同時書き込みを1つのトランザクションにまとめる）
+    GROUP_COMMIT_ENABLED: bool = os.getenv("GROUP_COMMIT_ENABLED", "False").lower() in ("true", "1", "yes", "on")
+    GROUP_COMMIT_WINDOW_MS: float = float(os.getenv("GROUP_COMMIT_WINDOW_MS", "2"))
+    GROUP_COMMIT_MAX_BATCH: int = int(os.getenv("GROUP_COMMIT_MAX_BATCH", "64"))
+    
+    # リクエスト単位のプロファイリング設定（X-Profileヘッダーまたは?profile=で有効化）
+    PROFILING_ENABLED: bool = os.getenv("PROFILING_ENABLED", "False").lower() in ("true", "1", "yes", "on")
+    PROFILING_TOKEN: str = os.getenv("PROFILING_TOKEN", "")  # 必須: ヘッダー値と一致する必要がある（空ではプロファイルしない）
+    PROFILING_INTERVAL_MS: float = float(os.getenv("PROFILING_INTERVAL_MS", "1"))
+    PROFILE_DIR: str = os.getenv("PROFILE_DIR", "./profiles")
+    PROFILE_RETENTION: int = int(os.getenv("PROFILE_RETENTION", "100"))  # 保持するプロファイル数
+    
+    # バックアップ設定（SQLiteオンラインバックアップAPI）
+    BACKUP_DIR: str = os.getenv("BACKUP_DIR", "./backups")
+    BACKUP_INTERVAL_SECONDS: int = int(os.getenv("BACKUP_INTERVAL_SECONDS", "0"))  # 0で定期スナップショット無効
+    BACKUP_RETENTION: int = int(os.getenv("BACKUP_RETENTION", "7"))
+    BACKUP_PAGES_PER_STEP: int = int(os.getenv("BACKUP_PAGES_PER_STEP", "64"))
+    BACKUP_STEP_SLEEP_MS: int = int(os.getenv("BACKUP_STEP_SLEEP_MS", "5"))
+    BACKUP_ENDPOINT_ENABLED: bool = os.getenv("BACKUP_ENDPOINT_ENABLED", "False").lower() in ("true", "1", "yes", "on")
+    
     # CORS設定
     ALLOWED_ORIGINS: list = [
         "http://localhost:3000",  # React app
@@ -30,6 +70,9 @@ class Settings:
     # サーバー設定
     HOST: str = os.getenv("HOST", "localhost")
     PORT: int = int(os.getenv("PORT", "8000"))
+    
+    # ワーカープロセス数（1より大きい場合はマルチワーカーで起動）
+    WORKERS: int = int(os.getenv("WORKERS", "1"))
 
 # グローバル設定インスタンス
 settings = Settings()
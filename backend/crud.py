@@ -0,0 +1,64 @@
+"""
+Query builders for Todo items.
+
+This module holds the queries shared by the API handlers and the
+maintenance scripts (for example the EXPLAIN checks in ``benchmarks/``),
+so both always look at exactly the same SQL.
+"""
+
+from typing import Literal
+
+from sqlalchemy.orm import Query, Session
+
+import models
+
+TodoSort = Literal["id", "title", "completed"]
+"""Sort keys accepted by ``GET /api/todos``."""
+
+# ソートキーごとのORDER BY句（idで安定したタイブレークを行う）
+SORT_COLUMNS = {
+    "id": (models.Todo.id,),
+    "title": (models.Todo.title, models.Todo.id),
+    "completed": (models.Todo.completed, models.Todo.id),
+}
+
+
+def todo_list_query(
+    db: Session,
+    tag: str | None = None,
+    completed: bool | None = None,
+    sort: TodoSort = "id",
+) -> Query:
+    """
+    Build the query used by ``GET /api/todos``.
+
+    Every sort key ends with ``id`` so pages are stable across requests.
+    Each combination of ``completed`` and ``sort`` is served by an index
+    (see ``models.Todo.__table_args__``) without a temporary sort.
+
+    Args:
+        db (Session): Database session.
+        tag (str, optional): Return only todos whose tags contain this text.
+        completed (bool, optional): Return only completed or only active todos.
+        sort (str): One of ``"id"``, ``"title"`` or ``"completed"``.
+
+    Returns:
+        Query: Ordered query, ready for ``offset``/``limit``.
+
+    Example:
+        >>> todo_list_query(db, completed=False, sort="title").limit(10).all()
+    """
+    # ベースクエリを作成
+    q = db.query(models.Todo)
+
+    # 完了状態で絞り込む（(completed, ...) 複合インデックスを使用）
+    if completed is not None:
+        q = q.filter(models.Todo.completed == completed)
+
+    # タグフィルタが指定された場合は、そのタグを含むTodoのみに絞り込む
+    if tag:
+        # tagsフィールドからLIKE検索（カンマ区切りの文字列内を検索）
+        like = f"%{tag}%"
+        q = q.filter(models.Todo._tags.like(like))
+
+    return q.order_by(*SORT_COLUMNS[sort])
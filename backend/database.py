@@ -5,20 +5,210 @@ This module sets up SQLAlchemy database connection, session management,
 and provides the base class for all database models.
 """
 
-from sqlalchemy import create_engine
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import NullPool, Pool, QueuePool, SingletonThreadPool, StaticPool
 from config import settings
 
 # 環境変数からデータベースURLを取得
 SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
 """str: Database URL for SQLite connection."""
 
+class PoolStats:
+    """
+    Checkout counters of one connection pool.
+    
+    ``wait`` is the time a checkout spent inside the pool before it got a
+    connection, i.e. waiting for a free slot plus opening a new connection
+    when the pool had none idle. ``hold`` is the time from checkout until
+    the connection was returned.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.connects = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.checkins = 0
+        self.hold_seconds = 0.0
+        self.max_hold_seconds = 0.0
+
+    def record_checkout(self, seconds: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds += seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+
+    def record_checkin(self, seconds: float) -> None:
+        with self._lock:
+            self.checkins += 1
+            self.hold_seconds += seconds
+            self.max_hold_seconds = max(self.max_hold_seconds, seconds)
+
+    def snapshot(self) -> dict:
+        """
+        Return the counters.
+        
+        Returns:
+            dict: ``checkouts``, ``connects`` (new DBAPI connections),
+            ``timeouts``, ``avg_wait_ms``, ``max_wait_ms``, ``avg_hold_ms``
+            and ``max_hold_ms``.
+        """
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "connects": self.connects,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": (self.wait_seconds / self.checkouts * 1000) if self.checkouts else 0.0,
+                "max_wait_ms": self.max_wait_seconds * 1000,
+                "avg_hold_ms": (self.hold_seconds / self.checkins * 1000) if self.checkins else 0.0,
+                "max_hold_ms": self.max_hold_seconds * 1000,
+            }
+
+
+class _TimedPool:
+    """Pool mixin that records checkout wait and hold times in ``self.stats``."""
+
+    def __init__(self, *args, **kw):
+        super().__init__(*args, **kw)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except exc.TimeoutError:
+            with self.stats._lock:
+                self.stats.timeouts += 1
+            raise
+        now = time.perf_counter()
+        self.stats.record_checkout(now - started)
+        record.info["checked_out_at"] = now
+        return record
+
+    def _do_return_conn(self, record):
+        checked_out_at = record.info.pop("checked_out_at", None)
+        if checked_out_at is not None:
+            self.stats.record_checkin(time.perf_counter() - checked_out_at)
+        super()._do_return_conn(record)
+
+    def _create_connection(self):
+        with self.stats._lock:
+            self.stats.connects += 1
+        return super()._create_connection()
+
+    def recreate(self):
+        # dispose() 後も統計を引き継ぐ
+        new_pool = super().recreate()
+        new_pool.stats = self.stats
+        return new_pool
+
+
+class TimedQueuePool(_TimedPool, QueuePool):
+    """QueuePool with checkout statistics."""
+
+
+class TimedStaticPool(_TimedPool, StaticPool):
+    """StaticPool with checkout statistics."""
+
+
+class TimedNullPool(_TimedPool, NullPool):
+    """NullPool with checkout statistics."""
+
+
+class TimedSingletonThreadPool(_TimedPool, SingletonThreadPool):
+    """SingletonThreadPool with checkout statistics."""
+
+
+POOL_CLASSES: dict[str, type[Pool]] = {
+    "queue": TimedQueuePool,
+    "static": TimedStaticPool,
+    "null": TimedNullPool,
+    "singleton": TimedSingletonThreadPool,
+}
+"""dict: Pool classes selectable with ``settings.DB_POOL_CLASS``."""
+
+
+def pool_options(url: str) -> dict:
+    """
+    Build the ``create_engine`` pool arguments for a database URL.
+    
+    Without ``settings.DB_POOL_CLASS`` the pool class follows the backend:
+    an in-memory SQLite database lives inside a single connection and gets
+    a ``StaticPool``; file-backed SQLite and server databases get a
+    ``QueuePool`` sized by ``DB_POOL_SIZE`` / ``DB_MAX_OVERFLOW``.
+    
+    Args:
+        url (str): Database URL.
+        
+    Returns:
+        dict: Keyword arguments for ``create_engine``.
+        
+    Raises:
+        ValueError: If ``settings.DB_POOL_CLASS`` is not a known pool name.
+    """
+    parsed = make_url(url)
+    in_memory = parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:")
+    name = settings.DB_POOL_CLASS.lower() or ("static" if in_memory else "queue")
+    if name not in POOL_CLASSES:
+        raise ValueError(f"Unknown DB_POOL_CLASS: {settings.DB_POOL_CLASS!r}")
+    options = {
+        "poolclass": POOL_CLASSES[name],
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
+    if name == "queue":
+        options.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+        )
+    elif name == "singleton":
+        options["pool_size"] = settings.DB_POOL_SIZE
+    return options
+
+
+def make_engine(url: str) -> Engine:
+    """
+    Create a SQLAlchemy engine configured for this application.
+    
+    File-backed SQLite databases are opened in WAL mode: readers do not
+    block the writer and the writer does not block readers, which lets
+    several worker processes share one file. The connection pool is
+    configured from ``settings`` (see :func:`pool_options`) and records
+    checkout statistics in ``engine.pool.stats``.
+    
+    Args:
+        url (str): Database URL.
+        
+    Returns:
+        Engine: New engine instance.
+    """
+    # check_same_thread=False: SQLiteでマルチスレッドアクセスを許可
+    new_engine = create_engine(url, connect_args={"check_same_thread": False}, **pool_options(url))
+
+    if new_engine.url.get_backend_name() == "sqlite" and new_engine.url.database not in (None, "", ":memory:"):
+        @event.listens_for(new_engine, "connect")
+        def _set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.close()
+
+    return new_engine
+
 # データベースエンジンを作成
-# check_same_thread=False: SQLiteでマルチスレッドアクセスを許可
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+engine = make_engine(SQLALCHEMY_DATABASE_URL)
 """Engine: SQLAlchemy database engine instance."""
 
 # データベースセッションファクトリを作成
@@ -27,13 +217,62 @@ engine = create_engine(
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 """sessionmaker: Database session factory for creating new sessions."""
 
+
+class ReadOnlySession(Session):
+    """
+    Session for read-only requests.
+    
+    Never flushes: a flush with nothing pending returns immediately, and
+    one with pending changes is an error instead of a silently dropped
+    write. See :func:`read_sessionmaker` for the transaction handling.
+    """
+
+    def flush(self, objects=None) -> None:
+        if self.new or self.dirty or self.deleted:
+            raise exc.InvalidRequestError("Cannot write through a read-only session")
+
+
+def read_sessionmaker(bind: Engine) -> sessionmaker:
+    """
+    Create a factory of :class:`ReadOnlySession` for an engine.
+    
+    The sessions share the engine's connection pool. On server databases
+    they run on ``AUTOCOMMIT`` connections, so no BEGIN / ROLLBACK round
+    trips are made around the queries. SQLite connections are used as is:
+    pysqlite never begins a transaction for a SELECT, and switching the
+    isolation level would cost an extra PRAGMA on every checkout.
+    
+    Args:
+        bind (Engine): Engine to read from.
+        
+    Returns:
+        sessionmaker: Read-only session factory.
+    """
+    if bind.url.get_backend_name() != "sqlite":
+        bind = bind.execution_options(isolation_level="AUTOCOMMIT")
+    return sessionmaker(
+        bind=bind,
+        class_=ReadOnlySession,
+        autoflush=False,
+        expire_on_commit=False,
+    )
+
+
+ReadSessionLocal = read_sessionmaker(engine)
+"""sessionmaker: Read-only session factory for GET requests on the main database."""
+
+
+def is_main_bind(bind) -> bool:
+    """Return True if ``bind`` (a session's bind) is the main database engine."""
+    return bind is engine or bind is ReadSessionLocal.kw["bind"]
+
 # SQLAlchemyモデルの基底クラスを作成
 # 全てのモデルクラスはこのBaseクラスを継承する
 Base = declarative_base()
 """DeclarativeMeta: Base class for all SQLAlchemy models."""
 
 
-def create_tables():
+def create_tables(bind: Engine | None = None):
     """
     Create all database tables.
     
@@ -41,8 +280,124 @@ def create_tables():
     that inherit from the Base class. It's safe to call multiple times
     as it only creates tables that don't already exist.
     
+    Indexes added to a model after its table was created are created
+    as well, so existing databases pick up new indexes on startup.
+    
+    Args:
+        bind (Engine, optional): Engine to create the tables in.
+            Defaults to the main ``engine``.
+    
     Example:
         >>> from database import create_tables
         >>> create_tables()
     """
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    bind = bind or engine
+    Base.metadata.create_all(bind=bind)
+    # 既存テーブルに後から追加されたインデックスを作成する
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+
+
+TENANT_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+"""Pattern: Allowed tenant identifiers (also used as shard file names)."""
+
+
+class TenantRouter:
+    """
+    Route tenants to their own SQLite shard.
+    
+    Each tenant gets its own database file under ``settings.TENANT_DB_DIR``,
+    and therefore its own write lock. Engines are created lazily on first
+    use, together with the schema, and kept in a bounded LRU; the least
+    recently used engine is disposed when the limit is exceeded (sessions
+    still using it finish normally). A new shard is set up under a lock of
+    its own tenant, so lookups of other tenants never wait for the schema
+    creation; the router-wide lock only guards the LRU.
+    
+    Args:
+        shard_dir (str): Directory holding the shard files.
+        max_engines (int): Maximum number of open shard engines.
+        on_create (Callable[[Engine], None], optional): Extra setup run once
+            for each newly opened shard after its tables are created.
+    
+    Example:
+        >>> router = TenantRouter("./tenants", max_engines=64)
+        >>> with router.sessionmaker_for("acme")() as db:
+        ...     db.query(models.Todo).count()
+    """
+
+    def __init__(self, shard_dir: str, max_engines: int = 64,
+                 on_create: Callable[[Engine], None] | None = None):
+        self.shard_dir = shard_dir
+        self.max_engines = max_engines
+        self.on_create = on_create
+        self._lock = threading.Lock()
+        self._shards: OrderedDict[str, tuple[sessionmaker, sessionmaker]] = OrderedDict()
+        self._opening: dict[str, threading.Lock] = {}  # 作成中のテナントごとのロック
+
+    def sessionmaker_for(self, tenant: str, read_only: bool = False) -> sessionmaker:
+        """
+        Return the session factory of a tenant's shard, opening it if needed.
+        
+        Args:
+            tenant (str): Tenant identifier matching ``TENANT_ID_PATTERN``.
+            read_only (bool): Return the :class:`ReadOnlySession` factory.
+            
+        Returns:
+            sessionmaker: Session factory bound to the tenant's engine.
+            
+        Raises:
+            ValueError: If the tenant identifier is invalid.
+        """
+        if not TENANT_ID_PATTERN.match(tenant):
+            raise ValueError(f"Invalid tenant id: {tenant!r}")
+        factories = self._lookup(tenant)
+        if factories is not None:
+            return factories[read_only]
+        with self._lock:
+            opening = self._opening.setdefault(tenant, threading.Lock())
+        # 同じテナントの作成は1回だけ行い、他のテナントの参照は待たせない
+        with opening:
+            factories = self._lookup(tenant)
+            if factories is not None:
+                return factories[read_only]
+            # 初回アクセス時にシャードを作成してスキーマを用意する
+            os.makedirs(self.shard_dir, exist_ok=True)
+            shard_engine = make_engine(f"sqlite:///{os.path.join(self.shard_dir, tenant)}.db")
+            create_tables(bind=shard_engine)
+            if self.on_create is not None:
+                self.on_create(shard_engine)
+            factories = (
+                sessionmaker(autocommit=False, autoflush=False, bind=shard_engine),
+                read_sessionmaker(shard_engine),
+            )
+            evicted = []
+            with self._lock:
+                self._shards[tenant] = factories
+                self._opening.pop(tenant, None)
+                # 上限を超えたら最も長く使われていないエンジンを閉じる
+                while len(self._shards) > self.max_engines:
+                    evicted.append(self._shards.popitem(last=False)[1][0])
+        for factory in evicted:
+            factory.kw["bind"].dispose()
+        return factories[read_only]
+
+    def _lookup(self, tenant: str) -> tuple[sessionmaker, sessionmaker] | None:
+        with self._lock:
+            factories = self._shards.get(tenant)
+            if factories is not None:
+                self._shards.move_to_end(tenant)
+            return factories
+
+    def dispose(self) -> None:
+        """Dispose every open shard engine."""
+        with self._lock:
+            while self._shards:
+                _, (factory, _) = self._shards.popitem()
+                factory.kw["bind"].dispose()
+
+
+# テナントごとのシャードルーター（TENANCY_ENABLEDの場合のみ使用）
+tenant_router = TenantRouter(settings.TENANT_DB_DIR, settings.TENANT_MAX_ENGINES)
+"""TenantRouter: Router used by ``get_db`` when tenancy is enabled."""
@@ -0,0 +1,255 @@
+"""
+Group commit: coalesce concurrent single-item writes into shared transactions.
+
+Without group commit every write request commits its own transaction and
+pays for its own fsync. With :class:`GroupCommitWriter` enabled, write
+handlers submit their change as a callable and block until a single writer
+thread has applied it. The writer collects operations for up to
+``window_ms`` milliseconds (or ``max_batch`` operations), applies them in
+arrival order inside one transaction and commits once.
+
+Durability semantics:
+
+* A request is answered only after the COMMIT of its batch has returned,
+  so an acknowledged write is exactly as durable as with per-request
+  commits (SQLite's ``synchronous`` setting is unchanged).
+* The batch's transaction is opened by bumping the table revision before
+  the first operation, so the operations, their SAVEPOINTs and the new
+  revision are committed together by a single COMMIT.
+* Each operation runs inside its own SAVEPOINT. An operation that raises
+  (for example a 404 for a missing todo) is rolled back on its own and
+  only its caller receives the error; the rest of the batch commits.
+* If the COMMIT itself fails, none of the batch is persisted and every
+  operation that was applied in it receives the commit error.
+* Writes are acknowledged up to ``window_ms`` later than before; a crash
+  before the COMMIT loses only writes that were never acknowledged.
+* An unexpected error in the writer (for example while closing the
+  session) fails the operations of its batch that have no result yet, and
+  the writer goes on with the next batch. If the writer thread is not
+  running, :meth:`GroupCommitWriter.submit` raises instead of waiting.
+* Each worker process runs its own writer, so batches never span processes.
+  Operations for different databases (tenant shards) in the same batch are
+  committed in one transaction per database, one after another on the
+  writer thread. With tenancy enabled, group commit therefore serializes
+  the commits of all tenants in a worker: it trades the per-tenant write
+  parallelism of the shards for fewer fsyncs per shard.
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, wait
+from typing import Any, Callable
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+import revisions
+
+logger = logging.getLogger(__name__)
+
+WRITER_CHECK_INTERVAL = 1.0
+"""float: Seconds between checks that the writer thread is alive while a caller waits."""
+
+
+class _Op:
+    """A queued write operation and the future that receives its result."""
+
+    __slots__ = ("fn", "bind", "future")
+
+    def __init__(self, fn: Callable[[Session], Any], bind: Engine):
+        self.fn = fn
+        self.bind = bind
+        self.future: Future = Future()
+
+
+class GroupCommitWriter:
+    """
+    Single writer thread that commits concurrent operations in batches.
+
+    Args:
+        bind (Engine): Default engine the writer commits to.
+        window_ms (float): Maximum time to wait for more operations after
+            the first one of a batch arrives.
+        max_batch (int): Maximum number of operations per transaction.
+        before_commit (Callable[[Session, int, list], None], optional): Called
+            on the writer thread inside each transaction, after the
+            operations and before the COMMIT, with the session, the new
+            table revision and the operations' results. If it raises, the
+            whole batch fails.
+        on_commit (Callable[[Engine, int, list], None], optional): Called on
+            the writer thread after each committed transaction with the
+            engine, the new table revision and the operations' results.
+            Exceptions it raises are logged and do not fail the batch.
+
+    Example:
+        >>> writer = GroupCommitWriter(database.engine, window_ms=2, max_batch=64)
+        >>> writer.start()
+        >>> todo = writer.submit(lambda db: create(db, payload))
+    """
+
+    def __init__(self, bind: Engine, window_ms: float = 2.0, max_batch: int = 64,
+                 before_commit: Callable[[Session, int, list], None] | None = None,
+                 on_commit: Callable[[Engine, int, list], None] | None = None):
+        self.bind = bind
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.before_commit = before_commit
+        self.on_commit = on_commit
+        self.batches = 0
+        self.ops = 0
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        """Start the writer thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Flush queued operations and stop the writer thread."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, fn: Callable[[Session], Any], bind: Engine | None = None) -> Any:
+        """
+        Apply ``fn`` in the next batch and wait for the batch to commit.
+
+        ``fn`` receives the writer's session, must not commit, and should
+        return the value for the caller (typically an ORM instance, which
+        stays readable after the commit).
+
+        Args:
+            fn: Operation to run inside the shared transaction.
+            bind (Engine, optional): Database to write to. Defaults to the
+                writer's default engine.
+
+        Returns:
+            Whatever ``fn`` returned, once the batch has been committed.
+
+        Raises:
+            Exception: The exception raised by ``fn``, or the commit error.
+            RuntimeError: If the writer thread is not running, or stops
+                before the operation has been processed.
+        """
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            raise RuntimeError("GroupCommitWriter is not running")
+        op = _Op(fn, bind or self.bind)
+        self._queue.put(op)
+        # ライタースレッドが終了していたら永久に待たずにエラーにする
+        while not wait([op.future], timeout=WRITER_CHECK_INTERVAL).done:
+            if not thread.is_alive():
+                raise RuntimeError("GroupCommitWriter stopped before the operation was committed")
+        return op.future.result()
+
+    def stats(self) -> dict:
+        """
+        Return batching counters.
+
+        Returns:
+            dict: ``batches`` committed, ``ops`` applied and ``avg_batch`` size.
+        """
+        return {
+            "batches": self.batches,
+            "ops": self.ops,
+            "avg_batch": (self.ops / self.batches) if self.batches else 0.0,
+        }
+
+    def _collect(self, first: _Op) -> tuple[list[_Op], bool]:
+        """Gather operations for one batch; also report whether to stop."""
+        batch = [first]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                op = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if op is None:
+                return batch, True
+            batch.append(op)
+        return batch, False
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch, stopping = self._collect(first)
+            self._commit_guarded(batch)
+        # 停止要求後に残っている操作も処理する
+        while True:
+            try:
+                op = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if op is not None:
+                self._commit_guarded([op])
+
+    def _commit_guarded(self, batch: list[_Op]) -> None:
+        try:
+            self._commit_batch(batch)
+        except Exception as e:
+            # 想定外のエラーでもライタースレッドは止めず、このバッチの未完了の操作にだけ返す
+            logger.exception("group commit batch failed")
+            for op in batch:
+                if not op.future.done():
+                    op.future.set_exception(e)
+
+    def _commit_batch(self, batch: list[_Op]) -> None:
+        # データベース（シャード）ごとに1トランザクションでコミットする
+        by_bind: dict[Engine, list[_Op]] = {}
+        for op in batch:
+            by_bind.setdefault(op.bind, []).append(op)
+        for bind, ops in by_bind.items():
+            self._commit(bind, ops)
+
+    def _commit(self, bind: Engine, batch: list[_Op]) -> None:
+        applied: list[tuple[_Op, Any]] = []
+        # expire_on_commit=False: コミット後も結果オブジェクトの属性を読めるようにする
+        db = Session(bind=bind, autoflush=False, expire_on_commit=False)
+        try:
+            # 先にリビジョンを進めてトランザクションを開始する
+            # （pysqliteはSAVEPOINTの前にBEGINを発行しないため、各SAVEPOINTが個別にコミットされてしまう）
+            revision = revisions.bump_revision(db)
+            for op in batch:
+                try:
+                    # 各操作はSAVEPOINT内で実行し、失敗しても他の操作に影響させない
+                    with db.begin_nested():
+                        result = op.fn(db)
+                        db.flush()
+                    applied.append((op, result))
+                except Exception as e:
+                    op.future.set_exception(e)
+            if not applied:
+                db.rollback()  # 全操作が失敗した場合はリビジョンも進めない
+                return
+            if self.before_commit is not None:
+                self.before_commit(db, revision, [result for _, result in applied])
+            db.commit()  # バッチ全体で1回だけコミット（fsync）
+        except Exception as e:
+            db.rollback()
+            # 適用済みの操作と、トランザクション開始の失敗で未処理の操作にエラーを返す
+            for op in batch:
+                if not op.future.done():
+                    op.future.set_exception(e)
+            return
+        finally:
+            db.close()
+
+        self.batches += 1
+        self.ops += len(applied)
+        if self.on_commit is not None:
+            try:
+                self.on_commit(bind, revision, [result for _, result in applied])
+            except Exception:
+                # コールバックが失敗しても、コミット済みの操作は成功として返し、ライターも止めない
+                logger.exception("group commit on_commit callback failed")
+        for op, result in applied:
+            op.future.set_result(result)
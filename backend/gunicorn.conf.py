@@ -0,0 +1,37 @@
+"""
+Gunicorn configuration for the multi-worker deployment mode.
+
+Runs ``settings.WORKERS`` uvicorn worker processes that share the SQLite
+database. Start with::
+
+    gunicorn -c gunicorn.conf.py main:app
+"""
+
+from config import settings
+
+# ワーカー設定
+bind = f"{settings.HOST}:{settings.PORT}"
+workers = settings.WORKERS
+worker_class = "uvicorn.workers.UvicornWorker"
+
+
+def on_starting(server):
+    """Create tables once in the master before any worker starts."""
+    import database
+    import revisions
+
+    database.create_tables()
+    with database.SessionLocal() as db:
+        revisions.ensure_revisions(db)
+    # SQLiteの接続はfork後に共有できないため、ワーカー起動前にプールを空にする
+    database.engine.dispose()
+
+
+def post_fork(server, worker):
+    """Drop any pooled connection inherited from the master without closing it."""
+    import sys
+
+    database = sys.modules.get("database")
+    if database is not None:
+        # close=False: 親プロセスが所有する接続をこのプロセスから閉じない
+        database.engine.dispose(close=False)
@@ -1,18 +1,85 @@
 # 必要なライブラリをインポート
+from contextlib import asynccontextmanager
 from typing import List
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, Header, HTTPException, Request, Response
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
 from fastapi.middleware.cors import CORSMiddleware # CORSをインポート
 
 # 自作モジュールをインポート
-import models, schemas, database
+import models, schemas, database, profiling, revisions
+from crud import TodoSort, todo_list_query
+from backup import BackupScheduler, create_snapshot
+from coalescing import SingleFlight
+from group_commit import GroupCommitWriter
+from mirror import TodoMirror
 from config import settings
+from profiling import profiled
 
 # データベーステーブルを作成
 database.create_tables()
+with database.SessionLocal() as _db:
+    revisions.ensure_revisions(_db)
+
+def _init_shard(shard_engine):
+    """Seed revision rows in a newly opened tenant shard."""
+    with Session(bind=shard_engine) as db:
+        revisions.ensure_revisions(db)
+
+database.tenant_router.on_create = _init_shard
+
+# GET /api/todos をSQLiteを使わずに応答するメモリ上のミラー（オプトイン、メインDBのみ）
+todo_mirror = TodoMirror() if settings.MIRROR_ENABLED else None
+
+def _mirror_apply(bind, revision: int, **changes):
+    """Apply a committed write to the in-memory mirror if it mirrors ``bind``."""
+    if todo_mirror is not None and database.is_main_bind(bind):
+        todo_mirror.apply(revision, **changes)
+
+def _log_changes(db: Session, revision: int, todo_ids):
+    """Log the changed todo ids before the commit so other workers' mirrors can catch up."""
+    if todo_mirror is not None and database.is_main_bind(db.get_bind()):
+        revisions.record_todo_changes(db, revision, todo_ids)
+
+# 同時書き込みを1つのトランザクションにまとめるライター（オプトイン）
+group_writer = (
+    GroupCommitWriter(
+        database.engine,
+        window_ms=settings.GROUP_COMMIT_WINDOW_MS,
+        max_batch=settings.GROUP_COMMIT_MAX_BATCH,
+        before_commit=lambda db, revision, results: _log_changes(db, revision, [t.id for t in results]),
+        on_commit=lambda bind, revision, results: _mirror_apply(bind, revision, upserts=results),
+    )
+    if settings.GROUP_COMMIT_ENABLED
+    else None
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Start and stop background services with the application.
+    
+    Starts the periodic snapshot scheduler when
+    ``settings.BACKUP_INTERVAL_SECONDS`` is greater than zero, and the
+    group commit writer when ``settings.GROUP_COMMIT_ENABLED`` is set.
+    """
+    scheduler = None
+    if settings.BACKUP_INTERVAL_SECONDS > 0:
+        scheduler = BackupScheduler(settings.BACKUP_INTERVAL_SECONDS)
+        scheduler.start()
+    if group_writer is not None:
+        group_writer.start()
+    try:
+        yield
+    finally:
+        if group_writer is not None:
+            group_writer.stop()
+        if scheduler is not None:
+            scheduler.stop()
+        database.tenant_router.dispose()
 
 # FastAPIアプリケーションのインスタンスを作成
-app = FastAPI(debug=settings.DEBUG)
+app = FastAPI(debug=settings.DEBUG, lifespan=lifespan)
 
 # CORSミドルウェアの設定
 # フロントエンドからのリクエストを許可するオリジン一覧
@@ -25,9 +92,42 @@ app.add_middleware(
     allow_credentials=True,       # 認証情報を含むリクエストを許可
     allow_methods=["*"],         # 全てのHTTPメソッドを許可
     allow_headers=["*"],         # 全てのHTTPヘッダーを許可
+    expose_headers=["ETag", "X-Profile-Id"],  # 条件付きGET・プロファイルIDをブラウザから読めるようにする
 )
 
-def get_db():
+async def profile_requests(request: Request, call_next):
+    """
+    Profile requests that ask for it with ``X-Profile`` or ``?profile=``.
+    
+    The handler runs under the sampling profiler in :mod:`profiling`; the
+    result is stored in ``settings.PROFILE_DIR`` (keeping the newest
+    ``settings.PROFILE_RETENTION`` profiles) and its id returned in the
+    ``X-Profile-Id`` response header.
+    """
+    if not profiling.is_requested(request.headers, request.query_params):
+        return await call_next(request)
+    session, token = profiling.start_session(f"{request.method} {request.url.path}")
+    try:
+        response = await call_next(request)
+    finally:
+        profiling.end_session(token)
+    session.save(settings.PROFILE_DIR)
+    profiling.prune_profiles(settings.PROFILE_DIR)
+    response.headers["X-Profile-Id"] = session.id
+    return response
+
+# プロファイリングが許可されている場合のみSQLフックとミドルウェアを追加する（無効時のオーバーヘッドなし）
+if settings.PROFILING_ENABLED:
+    profiling.install_sql_hooks()
+    app.middleware("http")(profile_requests)
+
+# 同一パラメータの同時GETを1つのクエリにまとめるためのシングルフライト
+todo_reads = SingleFlight()
+
+# Todoリストを一度だけJSONにシリアライズするためのアダプタ
+todo_list_adapter = TypeAdapter(List[schemas.Todo])
+
+def get_db(request: Request):
     """
     Database dependency injection function.
     
@@ -35,41 +135,82 @@ def get_db():
     closed after the request is completed. This is the recommended pattern
     for FastAPI database dependencies.
     
+    When ``settings.TENANCY_ENABLED`` is set, the tenant named in the
+    ``settings.TENANT_HEADER`` header is routed to its own SQLite shard;
+    requests without the header use the main database.
+    
+    GET requests get a :class:`database.ReadOnlySession`, which never
+    flushes (see :func:`database.read_sessionmaker`).
+    
+    Args:
+        request (Request): Incoming request, used to resolve the tenant.
+        
     Yields:
         Session: SQLAlchemy database session
         
+    Raises:
+        HTTPException: 400 if the tenant identifier is invalid.
+        
     Example:
         >>> @app.get("/api/todos")
         ... def read_todos(db: Session = Depends(get_db)):
         ...     return db.query(models.Todo).all()
     """
-    db = database.SessionLocal()
+    read_only = request.method == "GET"
+    session_factory = database.ReadSessionLocal if read_only else database.SessionLocal
+    tenant = request.headers.get(settings.TENANT_HEADER) if settings.TENANCY_ENABLED else None
+    if tenant:
+        try:
+            session_factory = database.tenant_router.sessionmaker_for(tenant, read_only=read_only)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    db = session_factory()
     try:
         yield db  # セッションを返す
     finally:
         db.close()  # セッションをクローズ
 
 @app.get("/api/todos", response_model=List[schemas.Todo])
-def read_todos(skip: int = 0, limit: int = 100, tag: str | None = None, db: Session = Depends(get_db)):
+@profiled
+def read_todos(
+    skip: int = 0,
+    limit: int = 100,
+    tag: str | None = None,
+    completed: bool | None = None,
+    sort: TodoSort = "id",
+    if_none_match: str | None = Header(default=None),
+    db: Session = Depends(get_db),
+):
     """
     Retrieve a list of Todo items with optional filtering and pagination.
     
     This endpoint returns Todo items from the database with support for:
     - Pagination using skip and limit parameters
     - Tag-based filtering using the tag parameter
+    - Server-side filtering by completion state and index-backed sorting
     - Automatic response model validation
+    - Coalescing of identical concurrent requests into one database query
+    - Optional in-memory columnar mirror (``settings.MIRROR_ENABLED``) that
+      answers id-ordered queries on the main database without SQLite
+    - Strong ETags derived from the todos table revision; a matching
+      ``If-None-Match`` gets ``304 Not Modified`` without querying todos
     
     Args:
         skip (int, optional): Number of records to skip. Defaults to 0.
         limit (int, optional): Maximum number of records to return. Defaults to 100.
         tag (str, optional): Filter todos by tag. Returns todos containing this tag.
+        completed (bool, optional): Return only completed (true) or active (false) todos.
+        sort (str, optional): Sort key, one of ``id``, ``title`` or ``completed``.
+            Ties are broken by ``id``. Defaults to ``id``.
+        if_none_match (str, optional): ETag(s) of the client's cached copy.
         db (Session): Database session dependency.
         
     Returns:
         List[schemas.Todo]: List of Todo items matching the criteria
         
     Example:
-        GET /api/todos?skip=0&limit=10&tag=work
+        GET /api/todos?skip=0&limit=10&tag=work&completed=false&sort=title
         
         Response:
         [
@@ -81,21 +222,47 @@ def read_todos(skip: int = 0, limit: int = 100, tag: str | None = None, db: Sess
             }
         ]
     """
-    # ベースクエリを作成
-    q = db.query(models.Todo)
-    
-    # タグフィルタが指定された場合は、そのタグを含むTodoのみに絞り込む
-    if tag:
-        # tagsフィールドからLIKE検索（カンマ区切りの文字列内を検索）
-        like = f"%{tag}%"
-        q = q.filter(models.Todo._tags.like(like))
-    
-    # ページネーションを適用してTodoリストを取得
-    todos = q.offset(skip).limit(limit).all()
-    return todos
+    def query() -> bytes:
+        # ミラーで応答できるクエリはSQLiteを使わない
+        if todo_mirror is not None and todo_mirror.supports(tag, sort) and database.is_main_bind(db.get_bind()):
+            todo_mirror.ensure_current(db, rev)
+            db.close()
+            rows = todo_mirror.query(tag=tag, completed=completed, skip=skip, limit=limit)
+            if rows is not None:
+                return todo_list_adapter.dump_json(todo_list_adapter.validate_python(rows))
 
-@app.post("/api/todos", response_model=schemas.Todo, status_code=201)
-def create_todo(todo: schemas.TodoCreate, db: Session = Depends(get_db)):
+        # 絞り込み・並び替え済みのクエリを作成
+        q = todo_list_query(db, tag=tag, completed=completed, sort=sort)
+        
+        # ページネーションを適用してTodoリストを取得し、一度だけシリアライズする
+        todos = q.offset(skip).limit(limit).all()
+        # シリアライズ前に接続をプールへ返す（読み込み済みの属性はクローズ後も参照できる）
+        db.close()
+        return todo_list_adapter.dump_json(
+            todo_list_adapter.validate_python(todos, from_attributes=True)
+        )
+
+    # リビジョンはtodosテーブルに触れずに取得できる（クエリより先に読むことで本文は常にこれ以降の状態）
+    rev = revisions.current_revision(db)
+    params = (str(db.get_bind().url), skip, limit, tag, completed, sort)
+    headers = {"ETag": revisions.make_etag(rev, *params), "Cache-Control": "no-cache"}
+
+    # クライアントのキャッシュが最新なら本文なしで返す（接続はすぐにプールへ返す）
+    if revisions.etag_matches(if_none_match, headers["ETag"]):
+        db.close()
+        return Response(status_code=304, headers=headers)
+
+    if settings.COALESCE_READS:
+        # 同時に届いた同一リクエストは先行リクエストの結果を共有する
+        # キーにリビジョンを含め、どのワーカーで書き込まれても古い結果に合流しないようにする
+        # 先行リクエストの完了を待つ間は接続を保持しない（リーダーは同じ接続のままquery()を実行する）
+        body = todo_reads.do((rev, *params), query, on_wait=db.close)
+    else:
+        body = query()
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def _apply_create(db: Session, todo: schemas.TodoCreate) -> models.Todo:
+    """Add a new Todo to the session without committing."""
     # リクエストデータからTodoモデルのインスタンスを作成
     db_todo = models.Todo(title=todo.title, completed=todo.completed)
     
@@ -105,13 +272,10 @@ def create_todo(todo: schemas.TodoCreate, db: Session = Depends(get_db)):
     
     # データベースに新しいTodoを追加
     db.add(db_todo)
-    db.commit()          # 変更をコミット
-    db.refresh(db_todo)  # 作成されたデータを再取得（IDなど）
     return db_todo
 
-# 既存のTodoを更新するAPIエンドポイント
-@app.put("/api/todos/{todo_id}", response_model=schemas.Todo)
-def update_todo(todo_id: int, todo: schemas.TodoCreate, db: Session = Depends(get_db)):
+def _apply_update(db: Session, todo_id: int, todo: schemas.TodoCreate) -> models.Todo:
+    """Update an existing Todo in the session without committing."""
     # 指定されたIDのTodoを検索
     db_todo = db.query(models.Todo).filter(models.Todo.id == todo_id).first()
     
@@ -126,14 +290,44 @@ def update_todo(todo_id: int, todo: schemas.TodoCreate, db: Session = Depends(ge
     # タグが提供されている場合は更新
     if hasattr(todo, 'tags'):
         db_todo.tags = todo.tags
+    return db_todo
+
+@app.post("/api/todos", response_model=schemas.Todo, status_code=201)
+@profiled
+def create_todo(todo: schemas.TodoCreate, db: Session = Depends(get_db)):
+    # グループコミット有効時は他の同時書き込みと同じトランザクションでコミットする
+    if group_writer is not None:
+        return group_writer.submit(lambda wdb: _apply_create(wdb, todo), bind=db.get_bind())
+
+    db_todo = _apply_create(db, todo)
+    rev = revisions.bump_revision(db)  # 全ワーカーに変更を知らせる
+    db.flush()  # idを確定させて変更ログに記録する
+    _log_changes(db, rev, [db_todo.id])
+    db.commit()          # 変更をコミット
+    db.refresh(db_todo)  # 作成されたデータを再取得（IDなど）
+    _mirror_apply(db.get_bind(), rev, upserts=[db_todo])
+    return db_todo
+
+# 既存のTodoを更新するAPIエンドポイント
+@app.put("/api/todos/{todo_id}", response_model=schemas.Todo)
+@profiled
+def update_todo(todo_id: int, todo: schemas.TodoCreate, db: Session = Depends(get_db)):
+    if group_writer is not None:
+        return group_writer.submit(lambda wdb: _apply_update(wdb, todo_id, todo), bind=db.get_bind())
+
+    db_todo = _apply_update(db, todo_id, todo)
     
     # 変更をデータベースに保存
+    rev = revisions.bump_revision(db)
+    _log_changes(db, rev, [todo_id])
     db.commit()
     db.refresh(db_todo)  # 更新されたデータを再取得
+    _mirror_apply(db.get_bind(), rev, upserts=[db_todo])
     return db_todo
 
 # 指定されたTodoを削除するAPIエンドポイント
 @app.delete("/api/todos/{todo_id}", response_model=schemas.Todo)
+@profiled
 def delete_todo(todo_id: int, db: Session = Depends(get_db)):
     # 指定されたIDのTodoを検索
     db_todo = db.query(models.Todo).filter(models.Todo.id == todo_id).first()
@@ -144,12 +338,16 @@ def delete_todo(todo_id: int, db: Session = Depends(get_db)):
     
     # Todoをデータベースから削除
     db.delete(db_todo)
+    rev = revisions.bump_revision(db)
+    _log_changes(db, rev, [todo_id])
     db.commit()  # 削除をコミット
+    _mirror_apply(db.get_bind(), rev, deleted_ids=[todo_id])
     return db_todo  # 削除されたTodoを返す
 
 
 # 全てのTodoを削除するAPIエンドポイント
 @app.delete("/api/todos", response_model=dict)
+@profiled
 def delete_all_todos(db: Session = Depends(get_db)):
     """全てのTodoを削除する"""
     # 削除前のTodo件数を取得
@@ -157,7 +355,10 @@ def delete_all_todos(db: Session = Depends(get_db)):
     
     # 全てのTodoを削除
     db.query(models.Todo).delete()
+    rev = revisions.bump_revision(db)
+    _log_changes(db, rev, None)  # 全件削除
     db.commit()  # 削除をコミット
+    _mirror_apply(db.get_bind(), rev, cleared=True)
     
     # 削除結果を返す
     return {"message": f"Deleted {count} todos", "count": count}
@@ -165,13 +366,17 @@ def delete_all_todos(db: Session = Depends(get_db)):
 
 # デモデータを作成するAPIエンドポイント
 @app.post("/api/demo", response_model=List[schemas.Todo], status_code=201)
+@profiled
 def create_demo_data(clear: bool = False, db: Session = Depends(get_db)):
     """デモ用のTodoデータを作成する。clearがTrueの場合は既存のTodoを全て削除してから作成する"""
     
     # clearフラグがTrueの場合は既存のTodoを全て削除
     if clear:
         db.query(models.Todo).delete()
+        rev = revisions.bump_revision(db)
+        _log_changes(db, rev, None)
         db.commit()
+        _mirror_apply(db.get_bind(), rev, cleared=True)
 
     # デモ用のサンプルTodoデータ
     samples = [
@@ -191,20 +396,109 @@ def create_demo_data(clear: bool = False, db: Session = Depends(get_db)):
         created.append(t)
 
     # 全ての変更をコミット
+    rev = revisions.bump_revision(db)
+    db.flush()
+    _log_changes(db, rev, [t.id for t in created])
     db.commit()
     
     # 作成されたTodoデータを更新（IDなどを取得するため）
     for t in created:
         db.refresh(t)
+    _mirror_apply(db.get_bind(), rev, upserts=created)
 
     return created  # 作成されたTodoリストを返す
 
 
+# リクエスト統合（シングルフライト）の統計を返すAPIエンドポイント
+@app.get("/api/stats/coalescing", response_model=dict)
+def read_coalescing_stats():
+    """
+    Return request coalescing counters for ``GET /api/todos``.
+    
+    Returns:
+        dict: ``leaders`` (queries executed), ``followers`` (requests that
+        shared another request's query), ``in_flight`` and ``coalescing_rate``.
+    """
+    return todo_reads.stats()
+
+
+# グループコミットの統計を返すAPIエンドポイント
+@app.get("/api/stats/group-commit", response_model=dict)
+def read_group_commit_stats():
+    """
+    Return group commit counters.
+    
+    Returns:
+        dict: ``enabled`` plus ``batches``, ``ops`` and ``avg_batch`` when enabled.
+    """
+    if group_writer is None:
+        return {"enabled": False}
+    return {"enabled": True, **group_writer.stats()}
+
+
+# 列指向ミラーの状態を返すAPIエンドポイント
+@app.get("/api/stats/mirror", response_model=dict)
+def read_mirror_stats():
+    """
+    Return the state of the in-memory todos mirror.
+    
+    Returns:
+        dict: ``enabled`` plus ``revision``, ``rows``, ``slots``, ``tags``
+        and ``memory_bytes`` when enabled.
+    """
+    if todo_mirror is None:
+        return {"enabled": False}
+    return {"enabled": True, **todo_mirror.stats()}
+
+
+# コネクションプールの統計を返すAPIエンドポイント
+@app.get("/api/stats/pool", response_model=dict)
+def read_pool_stats():
+    """
+    Return connection pool statistics of the main database.
+    
+    Returns:
+        dict: ``pool_class``, ``status`` (SQLAlchemy's pool summary),
+        ``checkouts``, ``connects``, ``timeouts``, ``avg_wait_ms``,
+        ``max_wait_ms``, ``avg_hold_ms`` and ``max_hold_ms``.
+    """
+    pool = database.engine.pool
+    return {"pool_class": type(pool).__name__, "status": pool.status(), **pool.stats.snapshot()}
+
+
+# オンラインバックアップ（スナップショット）を作成するAPIエンドポイント
+@app.post("/api/admin/backup", response_model=dict, status_code=201)
+def create_backup():
+    """
+    Take an online snapshot of the database.
+    
+    The snapshot is copied with SQLite's backup API in small page steps,
+    so concurrent writes keep working while it runs. Old snapshots beyond
+    ``settings.BACKUP_RETENTION`` are removed.
+    
+    Returns:
+        dict: Snapshot ``path``, ``bytes``, ``seconds``, ``steps``,
+        ``restarts`` and ``pruned`` snapshot paths.
+    
+    Raises:
+        HTTPException: 403 if ``settings.BACKUP_ENDPOINT_ENABLED`` is false,
+            400 if the database is not a file-backed SQLite database.
+    """
+    if not settings.BACKUP_ENDPOINT_ENABLED:
+        raise HTTPException(status_code=403, detail="Backup endpoint is disabled")
+    try:
+        return create_snapshot()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 if __name__ == "__main__":
     import uvicorn
+    # WORKERS > 1 の場合はマルチプロセスで起動する（リロードはシングルプロセス時のみ）
     uvicorn.run(
         "main:app", 
         host=settings.HOST, 
         port=settings.PORT, 
-        reload=settings.DEBUG
+        reload=settings.DEBUG and settings.WORKERS == 1,
+        workers=settings.WORKERS,
     )
\ No newline at end of file
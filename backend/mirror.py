@@ -0,0 +1,569 @@
+"""
+In-memory columnar mirror of the todos table for read queries.
+
+The mirror keeps the todos table as array-backed columns so that
+``GET /api/todos`` can be answered without SQLite or the ORM:
+
+* ``ids`` - todo ids (``array('q')``), one slot per row in ascending id order;
+* ``alive`` / ``completed`` - packed bitmaps over the slots;
+* ``title_ids`` - ids into a table of interned titles;
+* per-row tag ids (offset/count into a shared pool of interned tag ids);
+* per-tag posting lists - sorted ``array('I')`` of slots carrying the tag.
+
+Completed and pagination queries are answered by intersecting the
+``alive`` and ``completed`` bitmaps; tag queries walk the posting lists of
+every interned tag that matches and filter them against the bitmaps.
+Tag matching reproduces the SQL ``LIKE '%tag%'`` semantics (ASCII
+case-insensitive substring); queries the mirror cannot reproduce exactly
+(``%``, ``_`` or ``,`` in the tag, or a sort other than ``id``) fall back
+to SQLite.
+
+The mirror is labelled with the table revision (see :mod:`revisions`).
+Write handlers apply their changes incrementally when the mirror is at
+the preceding revision. A mirror that is behind (for example after a
+write in another worker process) catches up on the next read from the
+todos change log: only the rows changed since its revision are read
+again. It reloads the whole table only when it was never loaded, when the
+log does not cover the missing revisions (pruned, or a restore) or every
+todo was deleted. A write that fails to apply leaves the mirror to be
+reloaded instead of failing the request that committed it.
+
+Command line usage::
+
+    python mirror.py check   # compare the mirror with SQLite
+"""
+
+import argparse
+import heapq
+import logging
+import string
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+from typing import Iterable, Iterator
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import models
+import revisions
+
+logger = logging.getLogger(__name__)
+
+ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+"""dict: Translation table for SQLite's ASCII-only case folding in LIKE."""
+
+UNSUPPORTED_TAG_CHARS = frozenset("%_,")
+"""frozenset: Tag characters whose LIKE semantics the mirror does not reproduce."""
+
+COMPACT_SLACK = 1024
+"""int: Garbage entries tolerated on top of twice the live size before compacting."""
+
+CATCH_UP_CHUNK = 500
+"""int: Changed ids fetched per query while catching up (below SQLite's variable limit)."""
+
+
+def _split_tags(raw: str | None) -> list[str]:
+    # models.Todo.tags と同じ分割規則
+    return [t for t in raw.split(",") if t] if raw else []
+
+
+def _ascii_lower(text: str) -> str:
+    return text.translate(ASCII_LOWER)
+
+
+class TodoMirror:
+    """
+    Columnar in-memory copy of the todos table.
+
+    All methods are thread-safe.
+
+    Example:
+        >>> mirror = TodoMirror()
+        >>> mirror.load(db, revision=revisions.current_revision(db))
+        >>> mirror.query(tag="work", completed=False, skip=0, limit=20)
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self.revision: int | None = None  # None: 未ロード
+        self.ids = array("q")
+        self.title_ids = array("I")
+        self.tag_offsets = array("I")
+        self.tag_counts = array("I")
+        self.tag_pool = array("I")
+        self.pool_live = 0  # tag_poolのうち生存行が参照している要素数
+        self.alive = bytearray()
+        self.completed = bytearray()
+        self.live_rows = 0
+        self.titles: list[str | None] = []
+        self._title_lookup: dict[str | None, int] = {}
+        self.tag_names: list[str] = []
+        self._tag_lowers: list[str] = []
+        self._tag_lookup: dict[str, int] = {}
+        self.postings: list[array] = []
+
+    # ---- 内部ヘルパー -------------------------------------------------
+
+    def _intern_title(self, title: str | None) -> int:
+        tid = self._title_lookup.get(title)
+        if tid is None:
+            tid = self._title_lookup[title] = len(self.titles)
+            self.titles.append(title)
+        return tid
+
+    def _intern_tag(self, name: str) -> int:
+        tid = self._tag_lookup.get(name)
+        if tid is None:
+            tid = self._tag_lookup[name] = len(self.tag_names)
+            self.tag_names.append(name)
+            self._tag_lowers.append(_ascii_lower(name))
+            self.postings.append(array("I"))
+        return tid
+
+    @staticmethod
+    def _get_bit(bits: bytearray, slot: int) -> bool:
+        return bool(bits[slot >> 3] >> (slot & 7) & 1)
+
+    @staticmethod
+    def _set_bit(bits: bytearray, slot: int, value: bool) -> None:
+        if value:
+            bits[slot >> 3] |= 1 << (slot & 7)
+        else:
+            bits[slot >> 3] &= ~(1 << (slot & 7)) & 0xFF
+
+    def _slot_of(self, todo_id: int) -> int | None:
+        slot = bisect_left(self.ids, todo_id)
+        if slot < len(self.ids) and self.ids[slot] == todo_id:
+            return slot
+        return None
+
+    def _row_tags(self, slot: int) -> array:
+        start = self.tag_offsets[slot]
+        return self.tag_pool[start:start + self.tag_counts[slot]]
+
+    def _set_tags(self, slot: int, raw: str | None) -> None:
+        # 既存のタグのポスティングリストから外し、新しいタグを登録する
+        if slot < len(self.tag_offsets):
+            for tid in set(self._row_tags(slot)):
+                postings = self.postings[tid]
+                del postings[bisect_left(postings, slot)]
+            self.pool_live -= self.tag_counts[slot]
+        tag_ids = [self._intern_tag(t) for t in _split_tags(raw)]
+        offset = len(self.tag_pool)
+        self.tag_pool.extend(tag_ids)
+        self.pool_live += len(tag_ids)
+        if slot < len(self.tag_offsets):
+            self.tag_offsets[slot] = offset
+            self.tag_counts[slot] = len(tag_ids)
+        else:
+            self.tag_offsets.append(offset)
+            self.tag_counts.append(len(tag_ids))
+        for tid in set(tag_ids):
+            postings = self.postings[tid]
+            pos = bisect_left(postings, slot)
+            postings.insert(pos, slot)
+
+    def _append(self, todo_id: int, title: str | None, completed: bool, raw_tags: str | None) -> None:
+        slot = len(self.ids)
+        self.ids.append(todo_id)
+        self.title_ids.append(self._intern_title(title))
+        if slot >> 3 >= len(self.alive):
+            # 8バイト単位で拡張し、ワード単位の走査を可能にする
+            self.alive.extend(bytes(8))
+            self.completed.extend(bytes(8))
+        self._set_bit(self.alive, slot, True)
+        self._set_bit(self.completed, slot, bool(completed))
+        self._set_tags(slot, raw_tags)
+        self.live_rows += 1
+
+    def _kill(self, slot: int) -> None:
+        if self._get_bit(self.alive, slot):
+            self._set_bit(self.alive, slot, False)
+            self._set_tags(slot, None)
+            self.live_rows -= 1
+
+    def _upsert(self, todo_id: int, title: str | None, completed: bool, raw_tags: str | None) -> bool:
+        """Insert or update one row; return False if it cannot keep id order."""
+        slot = self._slot_of(todo_id)
+        if slot is None:
+            if self.ids and todo_id < self.ids[-1]:
+                return False  # 途中のidへの挿入はid順を保てない
+            self._append(todo_id, title, completed, raw_tags)
+            return True
+        if not self._get_bit(self.alive, slot):
+            self._set_bit(self.alive, slot, True)
+            self.live_rows += 1
+        self.title_ids[slot] = self._intern_title(title)
+        self._set_bit(self.completed, slot, bool(completed))
+        self._set_tags(slot, raw_tags)
+        return True
+
+    def _live_slots(self) -> Iterator[int]:
+        for slot in range(len(self.ids)):
+            if self._get_bit(self.alive, slot):
+                yield slot
+
+    def _row(self, slot: int) -> dict:
+        return {
+            "id": self.ids[slot],
+            "title": self.titles[self.title_ids[slot]],
+            "completed": self._get_bit(self.completed, slot),
+            "tags": [self.tag_names[t] for t in self._row_tags(slot)],
+        }
+
+    def _rebuild(self, rows: Iterable[tuple], revision: int | None) -> None:
+        # 一括構築: 行はid順なので、ポスティングリストは末尾への追加だけで済む
+        self._reset()
+        rows = list(rows)
+        nbytes = (len(rows) + 63) // 64 * 8
+        self.completed = bytearray(nbytes)
+        ids, title_ids, pool = self.ids, self.title_ids, self.tag_pool
+        offsets, counts, done = self.tag_offsets, self.tag_counts, self.completed
+        intern_title, intern_tag, postings = self._intern_title, self._intern_tag, self.postings
+        for slot, (todo_id, title, completed, raw_tags) in enumerate(rows):
+            ids.append(todo_id)
+            title_ids.append(intern_title(title))
+            offsets.append(len(pool))
+            tag_ids = [intern_tag(t) for t in raw_tags.split(",") if t] if raw_tags else ()
+            counts.append(len(tag_ids))
+            if tag_ids:
+                pool.extend(tag_ids)
+                for tid in set(tag_ids):
+                    postings[tid].append(slot)
+            if completed:
+                done[slot >> 3] |= 1 << (slot & 7)
+        self.alive = bytearray(((1 << len(rows)) - 1).to_bytes(nbytes, "little"))
+        self.live_rows = len(rows)
+        self.pool_live = len(pool)
+        self.revision = revision
+
+    def _needs_compaction(self) -> bool:
+        # 削除済みスロット、更新で置き換えられたタグ列・タイトル、使われなくなったタグ名が
+        # 生存行の使用量の2倍を超えたら詰め直す
+        live, pool_live = self.live_rows, self.pool_live
+        return (
+            len(self.ids) > 2 * live + COMPACT_SLACK
+            or len(self.titles) > 2 * live + COMPACT_SLACK
+            or len(self.tag_pool) > 2 * pool_live + COMPACT_SLACK
+            or len(self.tag_names) > 2 * pool_live + COMPACT_SLACK
+        )
+
+    def _compact_if_needed(self) -> None:
+        # 生存行だけから作り直すため、インターン表も参照されているものだけになる
+        if self._needs_compaction():
+            rows = [
+                (self.ids[s], self.titles[self.title_ids[s]], self._get_bit(self.completed, s),
+                 ",".join(self.tag_names[t] for t in self._row_tags(s)))
+                for s in self._live_slots()
+            ]
+            self._rebuild(rows, self.revision)
+
+    # ---- 公開API ------------------------------------------------------
+
+    def load(self, db: Session, revision: int) -> None:
+        """
+        Load every row from the database.
+
+        ``revision`` must have been read before the rows, so the loaded
+        content is at least as new as its label. Incremental updates are
+        idempotent, so re-applying a write already contained in the load
+        is harmless.
+
+        Args:
+            db (Session): Database session.
+            revision (int): Todos revision read before loading.
+        """
+        stmt = select(
+            models.Todo.id, models.Todo.title, models.Todo.completed, models.Todo._tags
+        ).order_by(models.Todo.id)
+        rows = db.execute(stmt).all()
+        with self._lock:
+            self._rebuild(rows, revision)
+
+    def ensure_current(self, db: Session, revision: int) -> None:
+        """
+        Bring the mirror up to ``revision`` if it is older.
+
+        A loaded mirror re-reads only the rows listed in the change log for
+        the missing revisions; the whole table is loaded only if that is
+        not possible.
+
+        Args:
+            db (Session): Database session.
+            revision (int): Current todos revision.
+        """
+        with self._lock:
+            if self.revision is not None and self.revision >= revision:
+                return
+            if self.revision is not None:
+                try:
+                    if self._catch_up(db, revision):
+                        return
+                except Exception:
+                    self.revision = None  # 途中まで反映した列は使わない
+                    logger.exception("failed to catch up the todos mirror to revision %d", revision)
+            self.load(db, revision)
+
+    def _catch_up(self, db: Session, revision: int) -> bool:
+        # 変更ログで変更されたidだけを読み直す（リビジョンの読み取り後に読むので、内容はラベル以降の状態）
+        changed = revisions.todo_changes_since(db, self.revision, revision)
+        if changed is None or None in changed:
+            return False  # ログが欠けている、または全件削除があった
+        ids = sorted(set(changed))
+        rows = {}
+        columns = (models.Todo.id, models.Todo.title, models.Todo.completed, models.Todo._tags)
+        for start in range(0, len(ids), CATCH_UP_CHUNK):
+            chunk = ids[start:start + CATCH_UP_CHUNK]
+            for row in db.execute(select(*columns).where(models.Todo.id.in_(chunk))):
+                rows[row[0]] = row
+        # id順に処理し、新しい行は末尾への追加で済むようにする
+        for todo_id in ids:
+            row = rows.get(todo_id)
+            if row is None:
+                slot = self._slot_of(todo_id)
+                if slot is not None:
+                    self._kill(slot)
+            elif not self._upsert(*row):
+                return False
+        self.revision = revision
+        self._compact_if_needed()
+        return True
+
+    def apply(
+        self,
+        revision: int,
+        upserts: Iterable[models.Todo] = (),
+        deleted_ids: Iterable[int] = (),
+        cleared: bool = False,
+    ) -> None:
+        """
+        Apply a committed write.
+
+        The change is applied only when the mirror is at ``revision - 1``.
+        A mirror already at or past ``revision`` contains the write (it was
+        reloaded after the commit) and is left as is; an older one is left
+        behind and catches up on the next read. Errors while applying are
+        logged and mark the mirror for a reload, so the committed write is
+        never reported as failed because of the mirror.
+
+        Args:
+            revision (int): Revision produced by the write.
+            upserts (Iterable[models.Todo]): Created or updated todos.
+            deleted_ids (Iterable[int]): Ids of deleted todos.
+            cleared (bool): True if every todo was deleted first.
+        """
+        with self._lock:
+            if self.revision is not None and self.revision >= revision:
+                return  # コミット後の読み取りで再ロード済み
+            if self.revision != revision - 1:
+                return  # 未ロード、または他のワーカーの書き込みが未反映（次の読み取りで追従する）
+            try:
+                self._apply(revision, upserts, deleted_ids, cleared)
+            except Exception:
+                # 途中まで適用された列は信用できないため、次の読み取りで再ロードさせる
+                self.revision = None
+                logger.exception("failed to apply revision %d to the todos mirror", revision)
+
+    def _apply(self, revision: int, upserts: Iterable[models.Todo],
+               deleted_ids: Iterable[int], cleared: bool) -> None:
+        if cleared:
+            self._rebuild((), revision)
+        for todo_id in deleted_ids:
+            slot = self._slot_of(todo_id)
+            if slot is not None:
+                self._kill(slot)
+        for todo in upserts:
+            if not self._upsert(todo.id, todo.title, todo.completed, todo._tags):
+                self.revision = None
+                return
+        self.revision = revision
+        self._compact_if_needed()
+
+    def supports(self, tag: str | None, sort: str) -> bool:
+        """Return True if the mirror can answer a query with these parameters."""
+        return sort == "id" and not (tag and UNSUPPORTED_TAG_CHARS.intersection(tag))
+
+    def query(self, tag: str | None = None, completed: bool | None = None,
+              skip: int = 0, limit: int = 100) -> list[dict] | None:
+        """
+        Answer a ``GET /api/todos`` query ordered by id.
+
+        Args:
+            tag (str, optional): Substring to match in tags (``LIKE`` semantics).
+            completed (bool, optional): Completion state filter.
+            skip (int): Rows to skip.
+            limit (int): Maximum rows to return; negative means no limit.
+
+        Returns:
+            list[dict] | None: Rows as dictionaries, or None if the mirror is
+            not loaded or cannot answer the query.
+        """
+        if not self.supports(tag, "id"):
+            return None
+        skip = max(skip, 0)
+        with self._lock:
+            if self.revision is None:
+                return None
+            if limit == 0:
+                return []
+            if tag:
+                slots = self._tag_slots(tag, completed)
+            else:
+                slots = self._bitmap_slots(completed, skip)
+                skip = 0
+            out = []
+            for slot in slots:
+                if skip:
+                    skip -= 1
+                    continue
+                out.append(self._row(slot))
+                if len(out) == limit:
+                    break
+            return out
+
+    def _tag_slots(self, tag: str, completed: bool | None) -> Iterator[int]:
+        needle = _ascii_lower(tag)
+        lists = [self.postings[t] for t, name in enumerate(self._tag_lowers)
+                 if needle in name and self.postings[t]]
+        merged = lists[0] if len(lists) == 1 else heapq.merge(*lists)
+        last = -1
+        for slot in merged:
+            if slot == last:
+                continue  # 複数のタグに一致した行は1回だけ返す
+            last = slot
+            if completed is None or self._get_bit(self.completed, slot) == completed:
+                yield slot
+
+    def _bitmap_slots(self, completed: bool | None, skip: int = 0) -> Iterator[int]:
+        # alive AND (completed | NOT completed) のビットマップ積
+        bits = int.from_bytes(self.alive, "little")
+        if completed is not None:
+            done = int.from_bytes(self.completed, "little")
+            bits &= done if completed else ~done
+        words = memoryview(bits.to_bytes(len(self.alive), "little")).cast("Q")
+        for index, word in enumerate(words):
+            if skip:
+                # 読み飛ばす行はワード単位のpopcountで数える
+                count = word.bit_count()
+                if count <= skip:
+                    skip -= count
+                    continue
+                for _ in range(skip):
+                    word &= word - 1
+                skip = 0
+            base = index * 64
+            while word:
+                low = word & -word
+                yield base + low.bit_length() - 1
+                word ^= low
+
+    def memory_usage(self) -> int:
+        """
+        Estimate the memory held by the mirror.
+
+        Returns:
+            int: Approximate size in bytes of the columns, bitmaps, interned
+            strings, lookup tables and posting lists.
+        """
+        with self._lock:
+            size = sum(sys.getsizeof(a) for a in (
+                self.ids, self.title_ids, self.tag_offsets, self.tag_counts,
+                self.tag_pool, self.alive, self.completed,
+            ))
+            size += sys.getsizeof(self.titles) + sum(sys.getsizeof(t) for t in self.titles)
+            size += sys.getsizeof(self._title_lookup)
+            size += sys.getsizeof(self.tag_names) + sum(sys.getsizeof(t) for t in self.tag_names)
+            size += sys.getsizeof(self._tag_lowers) + sum(sys.getsizeof(t) for t in self._tag_lowers)
+            size += sys.getsizeof(self._tag_lookup)
+            size += sys.getsizeof(self.postings) + sum(sys.getsizeof(p) for p in self.postings)
+            return size
+
+    def stats(self) -> dict:
+        """
+        Return mirror status.
+
+        Returns:
+            dict: ``revision``, ``rows`` (live), ``slots``, ``tags`` and
+            ``memory_bytes``.
+        """
+        with self._lock:
+            return {
+                "revision": self.revision,
+                "rows": self.live_rows,
+                "slots": len(self.ids),
+                "tags": len(self.tag_names),
+                "memory_bytes": self.memory_usage(),
+            }
+
+
+def check_consistency(mirror: TodoMirror, db: Session, max_tags: int = 50) -> list[str]:
+    """
+    Compare the mirror with SQLite.
+
+    Checks the full row set and a range of tag, completed and pagination
+    queries against the SQL built by ``crud.todo_list_query``.
+
+    Args:
+        mirror (TodoMirror): Loaded mirror.
+        db (Session): Database session.
+        max_tags (int): Number of interned tags to probe.
+
+    Returns:
+        list[str]: Descriptions of mismatches; empty if consistent.
+    """
+    from crud import todo_list_query
+
+    def sql_rows(tag, completed, skip, limit):
+        q = todo_list_query(db, tag=tag, completed=completed, sort="id").offset(skip).limit(limit)
+        return [{"id": t.id, "title": t.title, "completed": bool(t.completed), "tags": t.tags} for t in q]
+
+    problems = []
+    probes: list[str | None] = [None]
+    for name in mirror.tag_names[:max_tags]:
+        probes += [name, name.upper(), name[1:-1] or name]
+    for tag in probes:
+        for completed in (None, True, False):
+            for skip, limit in ((0, -1), (0, 10), (5, 20)):
+                if not mirror.supports(tag, "id"):
+                    continue
+                expected = sql_rows(tag, completed, skip, limit)
+                actual = mirror.query(tag, completed, skip, limit)
+                if actual != expected:
+                    problems.append(
+                        f"tag={tag!r} completed={completed} skip={skip} limit={limit}: "
+                        f"{len(actual or [])} rows in mirror, {len(expected)} in SQLite"
+                    )
+    return problems
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="In-memory todos mirror tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("check", help="load the mirror and compare it with SQLite")
+    args = parser.parse_args(argv)
+
+    import database
+    import revisions
+
+    if args.command == "check":
+        mirror = TodoMirror()
+        with database.SessionLocal() as db:
+            mirror.load(db, revisions.current_revision(db))
+            problems = check_consistency(mirror, db)
+        stats = mirror.stats()
+        print(f"{stats['rows']} rows, {stats['tags']} tags, {stats['memory_bytes'] / 1e6:.1f} MB")
+        for problem in problems:
+            print(f"MISMATCH {problem}")
+        print("consistent" if not problems else f"{len(problems)} mismatches")
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,5 @@
 # SQLAlchemyの必要な要素をインポート
-from sqlalchemy import Boolean, Column, Integer, String
+from sqlalchemy import Boolean, Column, Index, Integer, String
 from database import Base
 
 class Todo(Base):
@@ -24,6 +24,13 @@ class Todo(Base):
     # データベーステーブル名を指定
     __tablename__ = "todos"
 
+    # 完了状態での絞り込み・並び替えを支える複合インデックス
+    # SQLiteのインデックスは末尾にrowid（id）を持つため、idでのタイブレークもインデックスで解決できる
+    __table_args__ = (
+        Index("ix_todos_completed_id", "completed", "id"),       # completed=?, ORDER BY id / completed
+        Index("ix_todos_completed_title", "completed", "title"), # completed=?, ORDER BY title
+    )
+
     # 各カラムの定義
     id = Column(Integer, primary_key=True, index=True)  # 主キー、自動インクリメント、インデックス付き
     title = Column(String, index=True)                   # Todoのタイトル、検索用インデックス付き
@@ -89,3 +96,47 @@ class Todo(Base):
         # その他の場合は空文字列
         else:
             self._tags = ""
+
+
+class TableRevision(Base):
+    """
+    テーブルごとのリビジョン番号を保持するSQLAlchemyモデルクラス。
+    
+    書き込みを行うトランザクションの中で対象テーブルのリビジョンを1つ進めます。
+    データベースを共有する全てのワーカープロセスから同じ値が見えるため、
+    プロセスごとのキャッシュが古くなっていないかを判定する手段として使用します。
+    
+    Attributes:
+        table_name (str): 対象テーブル名（主キー）
+        revision (int): 書き込みのたびに増加するリビジョン番号
+    
+    Example:
+        >>> rev = TableRevision(table_name="todos", revision=0)
+    """
+    __tablename__ = "table_revisions"
+
+    table_name = Column(String, primary_key=True)        # 対象テーブル名
+    revision = Column(Integer, nullable=False, default=0) # リビジョン番号
+
+
+class TodoChange(Base):
+    """
+    todosテーブルの変更ログを表すSQLAlchemyモデルクラス。
+    
+    書き込みと同じトランザクションで、そのリビジョンで作成・更新・削除された
+    Todoのidを記録します。各ワーカーのメモリ上のミラーはこのログを読み、
+    他のワーカーの書き込みに変更された行だけを再取得して追従します。
+    
+    Attributes:
+        id (int): ログ行の識別子（主キー）
+        revision (int): 変更を行った書き込みのリビジョン番号
+        todo_id (int | None): 変更されたTodoのid。全件削除の場合はNone
+    
+    Example:
+        >>> change = TodoChange(revision=12, todo_id=3)
+    """
+    __tablename__ = "todo_changes"
+
+    id = Column(Integer, primary_key=True)                      # ログ行の識別子
+    revision = Column(Integer, nullable=False, index=True)      # 変更時のリビジョン番号
+    todo_id = Column(Integer, nullable=True)                     # 変更されたTodoのid（Noneは全件削除）
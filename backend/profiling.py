@@ -0,0 +1,341 @@
+"""
+On-demand request profiling with flame-graph output.
+
+When ``settings.PROFILING_ENABLED`` is set, a request that carries the
+value of ``settings.PROFILING_TOKEN`` in the ``X-Profile`` header or the
+``profile`` query parameter runs its handler under a sampling profiler
+(without a token, no request is profiled). The handler thread's stack is sampled every
+``settings.PROFILING_INTERVAL_MS`` milliseconds. Samples taken while a SQL
+statement is executing get that statement appended as a leaf frame, so
+database time shows up in the flame graph next to the Python code that
+issued it.
+
+Each profile is stored in ``settings.PROFILE_DIR`` as:
+
+* ``<id>.collapsed`` - collapsed stacks, loadable in speedscope or
+  ``flamegraph.pl``;
+* ``<id>.json`` - request metadata and every SQL statement with its duration.
+
+The profile id is returned in the ``X-Profile-Id`` response header. Only
+the newest ``settings.PROFILE_RETENTION`` profiles are kept.
+
+Command line usage::
+
+    python profiling.py top [-n 20]           # hottest frames across all profiles
+    python profiling.py merge out.collapsed   # merge all profiles into one file
+"""
+
+import argparse
+import functools
+import glob
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config import settings
+
+_active: ContextVar["ProfileSession | None"] = ContextVar("profile_session", default=None)
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _clean(text: str) -> str:
+    # collapsed形式では ';' がフレーム区切り、改行がレコード区切り
+    return " ".join(text.split()).replace(";", ",")
+
+
+class ProfileSession:
+    """
+    Samples and SQL statements collected for one request.
+
+    Args:
+        name (str): Label of the profiled request, e.g. ``"GET /api/todos"``.
+        interval (float): Sampling interval in seconds.
+    """
+
+    def __init__(self, name: str, interval: float):
+        self.id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.name = name
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self.statements: list[dict] = []
+        self.current_sql: str | None = None
+        self.started = time.perf_counter()
+        self.handler_seconds = 0.0
+
+    def sample(self, frame) -> None:
+        """Record one sample of the given (leaf) frame's stack."""
+        stack = []
+        while frame is not None:
+            stack.append(_frame_name(frame))
+            frame = frame.f_back
+        stack.reverse()
+        sql = self.current_sql
+        if sql is not None:
+            stack.append(f"[sql] {_clean(sql)[:120]}")
+        self.samples[";".join(_clean(f) for f in stack)] += 1
+
+    def save(self, directory: str) -> str:
+        """
+        Write the collapsed stacks and the SQL log.
+
+        Args:
+            directory (str): Output directory.
+
+        Returns:
+            str: Path of the ``.collapsed`` file.
+        """
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, self.id)
+        with open(base + ".collapsed", "w") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        with open(base + ".json", "w") as f:
+            json.dump(
+                {
+                    "id": self.id,
+                    "request": self.name,
+                    "handler_ms": self.handler_seconds * 1000,
+                    "interval_ms": self.interval * 1000,
+                    "samples": sum(self.samples.values()),
+                    "sql_ms": sum(s["ms"] for s in self.statements),
+                    "statements": self.statements,
+                },
+                f,
+                indent=2,
+            )
+        return base + ".collapsed"
+
+
+def start_session(name: str):
+    """
+    Activate profiling for the current request context.
+
+    Returns:
+        tuple: The new :class:`ProfileSession` and the context token to pass
+        to :func:`end_session`.
+    """
+    session = ProfileSession(name, settings.PROFILING_INTERVAL_MS / 1000)
+    return session, _active.set(session)
+
+
+def end_session(token) -> None:
+    """Deactivate the session started with :func:`start_session`."""
+    _active.reset(token)
+
+
+def is_requested(headers, query_params) -> bool:
+    """
+    Check whether a request asks for profiling and is allowed to.
+
+    Args:
+        headers: Request headers.
+        query_params: Request query parameters.
+
+    Returns:
+        bool: True if profiling is enabled, a token is configured and the
+        request carries it.
+    """
+    if not settings.PROFILING_ENABLED or not settings.PROFILING_TOKEN:
+        return False  # トークンなしでは誰でもディスクにプロファイルを書かせられるため無効
+    value = headers.get("X-Profile") or query_params.get("profile")
+    if not value:
+        return False
+    return hmac.compare_digest(value.encode(), settings.PROFILING_TOKEN.encode())
+
+
+def prune_profiles(directory: str | None = None, retention: int | None = None) -> list[str]:
+    """
+    Delete profiles beyond the retention count, oldest first.
+
+    Args:
+        directory (str, optional): Profile directory. Defaults to ``settings.PROFILE_DIR``.
+        retention (int, optional): Number of profiles to keep.
+            Defaults to ``settings.PROFILE_RETENTION``.
+
+    Returns:
+        list[str]: Paths of the deleted files.
+    """
+    directory = directory or settings.PROFILE_DIR
+    retention = settings.PROFILE_RETENTION if retention is None else retention
+    # idの時刻は秒単位のため、更新時刻で新しい順に並べる
+    profiles = sorted(glob.glob(os.path.join(directory, "*.collapsed")), key=os.path.getmtime, reverse=True)
+    removed = []
+    for path in profiles[max(retention, 0):]:
+        for stale in (path, path[:-len(".collapsed")] + ".json"):
+            if os.path.exists(stale):
+                os.remove(stale)
+                removed.append(stale)
+    return removed
+
+
+def profiled(fn):
+    """
+    Decorator that samples a synchronous handler when profiling is active.
+
+    Costs a single context variable lookup when the request is not profiled.
+
+    Example:
+        >>> @app.get("/api/todos")
+        ... @profiled
+        ... def read_todos(...): ...
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        session = _active.get()
+        if session is None:
+            return fn(*args, **kwargs)
+
+        target = threading.get_ident()
+        stop = threading.Event()
+
+        def sampler():
+            while not stop.wait(session.interval):
+                frame = sys._current_frames().get(target)
+                # 停止後のサンプル（ハンドラー終了待ち）は記録しない
+                if frame is not None and not stop.is_set():
+                    session.sample(frame)
+
+        thread = threading.Thread(target=sampler, name="profiler", daemon=True)
+        started = time.perf_counter()
+        thread.start()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            stop.set()
+            thread.join()
+            session.handler_seconds += time.perf_counter() - started
+
+    return wrapper
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    session = _active.get()
+    if session is not None:
+        session.current_sql = statement
+        conn.info["profile_started"] = time.perf_counter()
+
+
+def _finish_statement(conn, statement: str, error: BaseException | None = None) -> None:
+    # 開始時刻はプールされた接続に残さない
+    started = conn.info.pop("profile_started", None)
+    session = _active.get()
+    if session is None:
+        return
+    session.current_sql = None
+    if started is not None:
+        record = {
+            "sql": _clean(statement),
+            "ms": (time.perf_counter() - started) * 1000,
+            "at_ms": (started - session.started) * 1000,
+        }
+        if error is not None:
+            record["error"] = type(error).__name__
+        session.statements.append(record)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _finish_statement(conn, statement)
+
+
+def _handle_error(context):
+    # 失敗した文ではafter_cursor_executeが呼ばれないため、ここで後始末する
+    if context.connection is not None:
+        _finish_statement(context.connection, context.statement or "", context.original_exception)
+
+
+def install_sql_hooks() -> None:
+    """
+    Record SQL statements in active profiles.
+
+    Registers cursor listeners on every engine; call it only when profiling
+    is enabled so that statements pay nothing otherwise. Safe to call more
+    than once.
+    """
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
+
+
+def load_stacks(directory: str) -> Counter:
+    """
+    Merge the collapsed stacks of every stored profile.
+
+    Args:
+        directory (str): Profile directory.
+
+    Returns:
+        Counter: Sample count per collapsed stack.
+    """
+    stacks: Counter = Counter()
+    for path in glob.glob(os.path.join(directory, "*.collapsed")):
+        with open(path) as f:
+            for line in f:
+                stack, _, count = line.rstrip("\n").rpartition(" ")
+                if stack:
+                    stacks[stack] += int(count)
+    return stacks
+
+
+def top_frames(stacks: Counter, limit: int = 20) -> list[tuple[str, int, int]]:
+    """
+    Rank frames by self and total (inclusive) samples.
+
+    Args:
+        stacks (Counter): Collapsed stacks with sample counts.
+        limit (int): Number of frames to return.
+
+    Returns:
+        list[tuple[str, int, int]]: ``(frame, self, total)`` sorted by self samples.
+    """
+    self_counts: Counter = Counter()
+    total_counts: Counter = Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(";")
+        self_counts[frames[-1]] += count
+        for frame in set(frames):
+            total_counts[frame] += count
+    ranked = sorted(total_counts, key=lambda f: (self_counts[f], total_counts[f]), reverse=True)
+    return [(f, self_counts[f], total_counts[f]) for f in ranked[:limit]]
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Aggregate stored request profiles")
+    parser.add_argument("--dir", default=settings.PROFILE_DIR, help="profile directory")
+    sub = parser.add_subparsers(dest="command", required=True)
+    top = sub.add_parser("top", help="show the hottest frames across all profiles")
+    top.add_argument("-n", type=int, default=20)
+    merge = sub.add_parser("merge", help="merge all profiles into one collapsed file")
+    merge.add_argument("output")
+    args = parser.parse_args(argv)
+
+    stacks = load_stacks(args.dir)
+    if args.command == "top":
+        total = sum(stacks.values()) or 1
+        print(f"{len(glob.glob(os.path.join(args.dir, '*.collapsed')))} profiles, {total} samples")
+        print(f"{'self':>7} {'total':>7}  frame")
+        for frame, self_count, total_count in top_frames(stacks, args.n):
+            print(f"{self_count / total:6.1%} {total_count / total:7.1%}  {frame}")
+    elif args.command == "merge":
+        with open(args.output, "w") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        print(f"wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Cross-process table revisions.
+
+Every write handler bumps the revision of the table it modifies inside
+its own transaction, so the new revision becomes visible to all worker
+processes atomically with the data. Per-worker state (request coalescing
+keys, caches, ETags) is keyed or validated by the revision and therefore
+stays coherent across processes without any extra messaging.
+
+Writers that keep per-worker copies of the todos table up to date also
+log the ids they changed under the new revision (``todo_changes``), so
+another worker can catch up with only the changed rows.
+"""
+
+import hashlib
+from typing import Iterable
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import models
+
+TODOS = models.Todo.__tablename__
+"""str: Revision key of the todos table."""
+
+CHANGE_LOG_KEEP = 10_000
+"""int: Number of recent revisions kept in the todos change log."""
+
+CHANGE_LOG_PRUNE_EVERY = 100
+"""int: The change log is pruned when the revision is a multiple of this."""
+
+
+def ensure_revisions(db: Session, tables: tuple[str, ...] = (TODOS,)) -> None:
+    """
+    Create missing revision rows so that writers only ever need an UPDATE.
+
+    Safe to call from several worker processes at startup.
+
+    Args:
+        db (Session): Database session.
+        tables (tuple[str, ...]): Table names to initialise.
+    """
+    for table in tables:
+        if db.get(models.TableRevision, table) is None:
+            db.add(models.TableRevision(table_name=table, revision=0))
+            try:
+                db.commit()
+            except IntegrityError:
+                # 他のワーカーが先に作成した
+                db.rollback()
+
+
+def current_revision(db: Session, table: str = TODOS) -> int:
+    """
+    Return the current revision of a table.
+
+    This is a single primary-key lookup on ``table_revisions`` and never
+    touches the table itself.
+
+    Args:
+        db (Session): Database session.
+        table (str): Table name. Defaults to ``"todos"``.
+
+    Returns:
+        int: Current revision, 0 if the table has never been written.
+    """
+    stmt = select(models.TableRevision.revision).where(models.TableRevision.table_name == table)
+    return db.execute(stmt).scalar() or 0
+
+
+def bump_revision(db: Session, table: str = TODOS) -> int:
+    """
+    Increment the revision of a table in the current transaction.
+
+    Call this before ``db.commit()`` in every handler that writes to the
+    table. The increment commits or rolls back together with the write.
+
+    Args:
+        db (Session): Database session with pending changes.
+        table (str): Table name. Defaults to ``"todos"``.
+
+    Returns:
+        int: The new revision (exact, since the transaction holds the
+        write lock once the UPDATE has run).
+    """
+    result = db.execute(
+        update(models.TableRevision)
+        .where(models.TableRevision.table_name == table)
+        .values(revision=models.TableRevision.revision + 1)
+    )
+    if result.rowcount == 0:
+        # ensure_revisions() が呼ばれていない場合の初回書き込み
+        db.add(models.TableRevision(table_name=table, revision=1))
+        return 1
+    return current_revision(db, table)
+
+
+def record_todo_changes(db: Session, revision: int, todo_ids: Iterable[int] | None) -> None:
+    """
+    Log the todos changed by a write in the current transaction.
+
+    Call this after :func:`bump_revision` and before ``db.commit()``, with
+    the ids already assigned (flush new todos first). Entries older than
+    ``CHANGE_LOG_KEEP`` revisions are pruned every
+    ``CHANGE_LOG_PRUNE_EVERY`` revisions.
+
+    Args:
+        db (Session): Database session of the write.
+        revision (int): Revision returned by :func:`bump_revision`.
+        todo_ids (Iterable[int] | None): Ids of created, updated or deleted
+            todos; None if every todo was deleted.
+    """
+    ids = [None] if todo_ids is None else list(todo_ids)
+    if ids:
+        db.execute(insert(models.TodoChange), [{"revision": revision, "todo_id": i} for i in ids])
+    if revision % CHANGE_LOG_PRUNE_EVERY == 0:
+        db.execute(delete(models.TodoChange).where(models.TodoChange.revision <= revision - CHANGE_LOG_KEEP))
+
+
+def todo_changes_since(db: Session, since: int, until: int) -> list[int | None] | None:
+    """
+    Return the todo ids changed by revisions ``since + 1`` to ``until``.
+
+    Args:
+        db (Session): Database session.
+        since (int): Last revision already known to the caller.
+        until (int): Revision to catch up to.
+
+    Returns:
+        list[int | None] | None: Changed ids (None marks a deletion of every
+        todo), or None if the log does not cover every revision in the range
+        (pruned, or written by a writer that does not log).
+    """
+    stmt = select(models.TodoChange.revision, models.TodoChange.todo_id).where(
+        models.TodoChange.revision > since, models.TodoChange.revision <= until
+    )
+    rows = db.execute(stmt).all()
+    if len({revision for revision, _ in rows}) != until - since:
+        return None
+    return [todo_id for _, todo_id in rows]
+
+
+def make_etag(revision: int, *params) -> str:
+    """
+    Build a strong ETag from a table revision and request parameters.
+
+    The body is never hashed: the same revision and parameters always
+    produce the same response, so they identify it completely.
+
+    Args:
+        revision (int): Table revision the response is based on.
+        *params: Everything else that shapes the response (query parameters,
+            database identity).
+
+    Returns:
+        str: Quoted ETag value, e.g. ``"12-3f9a0c1d2b4e5f60"``.
+    """
+    digest = hashlib.blake2b(repr(params).encode(), digest_size=8).hexdigest()
+    return f'"{revision}-{digest}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Check an ``If-None-Match`` header against an ETag.
+
+    Handles ``*``, comma-separated lists and weak (``W/``) validators, which
+    compare equal to strong ones for GET as required by RFC 9110.
+
+    Args:
+        if_none_match (str, optional): Raw ``If-None-Match`` header value.
+        etag (str): Current ETag of the resource.
+
+    Returns:
+        bool: True if the client's cached copy is current.
+    """
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
@@ -1,5 +1,6 @@
 import { useState, useEffect } from 'react';
 import { API_BASE_URL } from '../config/api';
+import { fetchTodos } from '../services/todoService';
 import type { Todo } from '../types/todo';
 
 /**
@@ -18,18 +19,14 @@ export function useTodos(tagQuery: string) {
 
   /**
    * サーバーからTodoリストを読み込む
-   * @description タグクエリが指定されている場合はフィルタリングされたTodoを取得
+   * @description タグクエリが指定されている場合はフィルタリングされたTodoを取得。ETagによる条件付きGETを使用
    */
   async function loadTodos() {
     setLoading(true);
     setError(null);
     try {
-      const url = tagQuery 
-        ? `${API_BASE_URL}/api/todos?tag=${encodeURIComponent(tagQuery)}` 
-        : `${API_BASE_URL}/api/todos`;
-      const res = await fetch(url);
-      if (!res.ok) throw new Error(`HTTP ${res.status}`);
-      const data = await res.json();
+      // 変更がなければサーバーは304を返し、fetchTodosはキャッシュ済みの配列を返す
+      const data = await fetchTodos(tagQuery || undefined);
       setTodos(data);
     } catch (e: any) {
       setError(e.message || 'Failed to load todos');
@@ -1,5 +1,5 @@
 import { describe, it, expect, vi, beforeEach } from 'vitest'
-import { fetchTodos, createTodoApi, updateTodoApi, deleteTodoApi } from '../todoService'
+import { fetchTodos, createTodoApi, updateTodoApi, deleteTodoApi, clearTodoListCache } from '../todoService'
 import type { Todo, TodoCreate } from '../../types/todo'
 
 // fetchをモック化
@@ -8,6 +8,7 @@ globalThis.fetch = vi.fn()
 describe('todoService', () => {
   beforeEach(() => {
     vi.resetAllMocks()
+    clearTodoListCache()
   })
 
   describe('fetchTodos', () => {
@@ -48,6 +49,47 @@ describe('todoService', () => {
       expect(result).toEqual(mockTodos)
     })
 
+    it('完了状態と並び替えをクエリパラメータで指定する', async () => {
+      vi.mocked(fetch).mockResolvedValueOnce({
+        ok: true,
+        json: async () => [],
+      } as Response)
+
+      await fetchTodos('work', { completed: false, sort: 'title' })
+
+      expect(fetch).toHaveBeenCalledWith(
+        expect.stringContaining('/api/todos?tag=work&completed=false&sort=title')
+      )
+    })
+
+    it('ETagを送信し304の場合はキャッシュ済みのリストを返す', async () => {
+      const mockTodos: Todo[] = [
+        { id: 1, title: 'テストTodo1', completed: false, tags: [] }
+      ]
+
+      vi.mocked(fetch)
+        .mockResolvedValueOnce({
+          ok: true,
+          status: 200,
+          headers: new Headers({ ETag: '"3-abc"' }),
+          json: async () => mockTodos,
+        } as Response)
+        .mockResolvedValueOnce({
+          ok: false,
+          status: 304,
+          headers: new Headers({ ETag: '"3-abc"' }),
+        } as Response)
+
+      await fetchTodos()
+      const result = await fetchTodos()
+
+      expect(fetch).toHaveBeenLastCalledWith(
+        expect.stringContaining('/api/todos'),
+        { headers: { 'If-None-Match': '"3-abc"' } }
+      )
+      expect(result).toEqual(mockTodos)
+    })
+
     it('APIエラーでエラーをスローする', async () => {
       vi.mocked(fetch).mockResolvedValueOnce({
         ok: false,
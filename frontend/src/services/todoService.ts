@@ -1,19 +1,58 @@
 import { API_BASE_URL } from '../config/api';
-import type { Todo, TodoCreate } from '../types/todo';
+import type { Todo, TodoCreate, TodoSort } from '../types/todo';
 
 const ENDPOINT = `${API_BASE_URL}/api/todos`;
 
+/**
+ * 条件付きGET用のキャッシュ（URLごとに直近のETagと本文を保持）
+ */
+const todoListCache = new Map<string, { etag: string; data: Todo[] }>();
+
+/**
+ * fetchTodosのサーバーサイド絞り込み・並び替えオプション
+ */
+export type FetchTodosOptions = {
+  /** true: 完了済みのみ、false: 未完了のみ、未指定: 全て */
+  completed?: boolean;
+  /** 並び替えキー（未指定時はサーバー既定のid順） */
+  sort?: TodoSort;
+};
+
 /**
  * サーバーからTodoリストを取得する
  * @param tag - フィルタリングするタグ名（オプション）
- * @returns Promise<Todo[]> - Todoアイテムの配列を返すPromise
+ * @param options - 完了状態での絞り込みと並び替え（オプション）
+ * @returns Promise<Todo[]> - Todoアイテムの配列を返すPromise（304の場合はキャッシュ済みの配列）
  * @throws {Error} HTTPリクエストが失敗した場合にエラーをスロー
  */
-export async function fetchTodos(tag?: string): Promise<Todo[]> {
-  const url = tag ? `${ENDPOINT}?tag=${encodeURIComponent(tag)}` : ENDPOINT;
-  const res = await fetch(url);
+export async function fetchTodos(tag?: string, options: FetchTodosOptions = {}): Promise<Todo[]> {
+  const params = new URLSearchParams();
+  if (tag) params.set('tag', tag);
+  if (options.completed !== undefined) params.set('completed', String(options.completed));
+  if (options.sort) params.set('sort', options.sort);
+  const query = params.toString();
+  const url = query ? `${ENDPOINT}?${query}` : ENDPOINT;
+
+  // 前回のETagがあれば送信し、変更がなければ304で本文を省略してもらう
+  const cached = todoListCache.get(url);
+  const res = cached
+    ? await fetch(url, { headers: { 'If-None-Match': cached.etag } })
+    : await fetch(url);
+  if (res.status === 304 && cached) return cached.data;
   if (!res.ok) throw new Error(`fetchTodos HTTP ${res.status}`);
-  return res.json();
+
+  const data: Todo[] = await res.json();
+  const etag = res.headers?.get('ETag');
+  if (etag) todoListCache.set(url, { etag, data });
+  return data;
+}
+
+/**
+ * fetchTodosの条件付きGETキャッシュを破棄する
+ * @description 主にテストで使用する
+ */
+export function clearTodoListCache(): void {
+  todoListCache.clear();
 }
 
 /**
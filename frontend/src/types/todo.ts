@@ -18,3 +18,10 @@ export type Todo = {
  * @remarks idフィールドを除いたTodo型のサブセット
  */
 export type TodoCreate = Omit<Todo, 'id'>;
+
+
+/**
+ * サーバーサイドでの並び替えキー
+ * @remarks 同じ値の場合はidの昇順で並ぶ
+ */
+export type TodoSort = 'id' | 'title' | 'completed';